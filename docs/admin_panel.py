@@ -0,0 +1,93 @@
+import os
+import pandas as pd
+from shiny import ui, reactive, render
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from data_store import store_stats, memory_totals, spilled_bytes, shared_frame_count, shared_bytes, MEMORY_BUDGET_BYTES
+from ingest_cache import cache_stats
+from column_profile import profile_stats
+
+# The debug panel and the JSON endpoint are only served when ADMIN_PANEL is set
+ADMIN_PANEL_ENABLED = os.environ.get("ADMIN_PANEL", "").lower() in ("1", "true", "yes")
+STORE_STATS_PATH = "/admin/store-stats.json"
+LOCAL_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+# Admin Panel UI
+admin_panel_layout = ui.card(
+    ui.h3("Memory and Reactivity Debug Panel"),
+    ui.output_text("store_totals"),
+    ui.h4("Sessions"),
+    ui.output_table("session_totals"),
+    ui.h4("Stored Values"),
+    ui.output_table("store_stats_table"),
+    ui.p(f"Machine-readable version (local requests only): {STORE_STATS_PATH}"),
+)
+
+
+def store_report():
+    """Snapshot of memory use and reactive activity of the data store across all sessions"""
+    totals = memory_totals()
+    return {
+        "budget_bytes": MEMORY_BUDGET_BYTES,
+        "total_bytes": sum(totals.values()) + shared_bytes(),
+        "shared_bytes": shared_bytes(),
+        "sessions": [
+            {"session": session_id, "bytes": size, "spilled_bytes": spilled_bytes(session_id)}
+            for session_id, size in totals.items()
+        ],
+        "values": store_stats(),
+        "shared_frames": shared_frame_count(),
+        "ingest_cache": dict(cache_stats),
+        "column_profiles": dict(profile_stats),
+    }
+
+
+async def store_stats_endpoint(request):
+    # Only answer requests made directly from this machine, not through a proxy
+    if request.client is None or request.client.host not in LOCAL_HOSTS or "x-forwarded-for" in request.headers:
+        return JSONResponse({"error": "Only available from localhost"}, status_code=403)
+    return JSONResponse(store_report())
+
+
+def register_admin_routes(app):
+    """Serve the store statistics as JSON from a Shiny app"""
+    app.starlette_app.routes.insert(0, Route(STORE_STATS_PATH, store_stats_endpoint, methods=["GET"]))
+
+
+def admin_panel_server(input, output, session):
+    @reactive.calc
+    def report():
+        reactive.invalidate_later(5)
+        return store_report()
+
+    @output
+    @render.text
+    def store_totals():
+        data = report()
+        return (f"{data['total_bytes'] / 1024 ** 2:.1f} MB held in memory of a {data['budget_bytes'] / 1024 ** 2:.0f} MB budget, "
+                f"{data['shared_frames']} datasets shared between sessions, "
+                f"ingest cache: {data['ingest_cache']['hits']} hits, {data['ingest_cache']['misses']} misses, "
+                f"column statistics cache: {data['column_profiles']['hits']} hits, {data['column_profiles']['misses']} misses")
+
+    @output
+    @render.table
+    def session_totals():
+        sessions = pd.DataFrame(report()["sessions"], columns=["session", "bytes", "spilled_bytes"])
+        sessions["MB"] = sessions.pop("bytes") / 1024 ** 2
+        sessions["Spilled MB"] = sessions.pop("spilled_bytes") / 1024 ** 2
+        return sessions
+
+    @output
+    @render.table
+    def store_stats_table():
+        stats = pd.DataFrame(report()["values"])
+        if stats.empty:
+            return stats
+        stats["MB"] = stats.pop("bytes") / 1024 ** 2
+        stats["Spilled MB"] = stats.pop("spilled_bytes") / 1024 ** 2
+        return stats.sort_values("MB", ascending=False)
+
+
+admin_panel_ui = ui.nav_panel("Admin", admin_panel_layout)
+
+admin_panel_body = admin_panel_layout
@@ -7,8 +7,9 @@ from feature_engineering import feature_engineering_ui, feature_engineering_serv
 from eda import eda_ui, eda_server, eda_body
 from data_download import data_download_ui, data_download_server, data_download_body
 from user_guide import user_guide_ui, user_guide_server, user_guide_body
+from admin_panel import admin_panel_ui, admin_panel_server, admin_panel_body, register_admin_routes, ADMIN_PANEL_ENABLED
 from data_store import df_raw, df_cleaned, df_engineered, error_store
-from data_store import user_ab_variant
+from data_store import user_ab_variant, end_session, schedule_memory_budget
 
 print("Initializing application...")
 
@@ -55,6 +56,16 @@ print("Defining server functions...")
 # Server function
 def server(input, output, session):
     print("Server function called...")
+
+    # Free this session's datasets when the browser disconnects
+    session_id = session.id
+    session.on_ended(lambda: end_session(session_id))
+
+    # Periodically spill the data of sessions that have gone idle to disk
+    @reactive.Effect
+    def spill_idle_sessions():
+        reactive.invalidate_later(60)
+        schedule_memory_budget()
     
     user_variant = reactive.Value(random.choice(["A","B"]))
 
@@ -172,6 +183,8 @@ def server(input, output, session):
     eda_server(input, output, session)
     feature_engineering_server(input, output, session)
     data_download_server(input, output, session)
+    if ADMIN_PANEL_ENABLED:
+        admin_panel_server(input, output, session)
     print("All module server functions initialized...")
     
     @output
@@ -184,7 +197,8 @@ def server(input, output, session):
                 data_cleaning_ui,
                 eda_ui, 
                 feature_engineering_ui,
-                data_download_ui
+                data_download_ui,
+                *([admin_panel_ui] if ADMIN_PANEL_ENABLED else [])
             )
         else:
             step = current_step.get()
@@ -225,11 +239,15 @@ def server(input, output, session):
                     ui.p("\U0001F389 You're done!")
                 )
             }
+            if ADMIN_PANEL_ENABLED:
+                return ui.div(steps.get(step, ui.p("Invalid step")), admin_panel_body)
             return steps.get(step, ui.p("Invalid step"))
 
 # Create application
 print("Creating application instance...")
 app = App(app_ui, server)
+if ADMIN_PANEL_ENABLED:
+    register_admin_routes(app)
 
 # Run application
 if __name__ == "__main__":
@@ -0,0 +1,402 @@
+import os
+import numpy as np
+import pandas as pd
+import scipy.sparse
+from quantile_sketch import outlier_bounds
+
+# Check if pyarrow library is installed for standardizing Arrow-backed text directly
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Version of the recipe file format written by recipe_document
+RECIPE_VERSION = 1
+
+# One-Hot Encoding warns above ONEHOT_WARN_BYTES of new indicator columns and refuses above ONEHOT_MAX_BYTES
+ONEHOT_WARN_BYTES = 100 * 1024 * 1024
+ONEHOT_MAX_BYTES = int(os.environ.get("ONEHOT_MAX_MB", "1024")) * 1024 * 1024
+# Values outside the kept categories are counted in this bucket
+OTHER_CATEGORY = "other"
+# Fill methods that use the values within each group of another column
+GROUP_FILL_METHODS = ["Group Mean", "Group Median", "Group Mode"]
+# Fill methods that need rows from the whole file, so recipes using them cannot be replayed in chunks
+WHOLE_FILE_FILL_METHODS = ["Backward Fill", "Time Interpolation"]
+
+# A sparse indicator stores a uint8 value and an int32 row position for each row that has a value
+SPARSE_BYTES_PER_VALUE = 5
+
+
+def is_text_column(series):
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+
+def json_value(value):
+    """Convert a value fitted from the data into one that can be written to JSON"""
+    if value is None or (np.ndim(value) == 0 and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+        return value.isoformat()
+    return value
+
+
+def is_arrow_text(series):
+    """Whether a column holds text in Arrow memory that pyarrow.compute can work on directly"""
+    dtype = series.dtype
+    if isinstance(dtype, pd.StringDtype):
+        return dtype.storage == "pyarrow"
+    return isinstance(dtype, pd.ArrowDtype) and (pa.types.is_string(dtype.pyarrow_dtype) or pa.types.is_large_string(dtype.pyarrow_dtype))
+
+
+def map_distinct(series, func):
+    """Apply func to each distinct value of a column once and map the results back to the rows.
+
+    func takes and returns a Series of distinct values. Categorical columns
+    stay categorical, with categories that became equal merged.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        uniques = series.cat.categories
+    else:
+        codes, uniques = pd.factorize(series)
+    mapped = func(pd.Series(uniques))
+    if isinstance(series.dtype, pd.CategoricalDtype) and not pd.api.types.is_numeric_dtype(mapped):
+        # Results may repeat, e.g. "A" and "a" both become "a"
+        new_codes, categories = pd.factorize(mapped)
+        new_codes = np.append(new_codes, -1)[codes]
+        return pd.Series(pd.Categorical.from_codes(new_codes, categories=categories), index=series.index)
+    values = mapped.to_numpy()
+    missing = codes < 0
+    if missing.any():
+        if values.dtype.kind in "iub":
+            values = values.astype(float)
+        values = np.append(values, np.nan)
+    return pd.Series(values[codes], index=series.index)
+
+
+def standardize_text(series):
+    """Lowercase and trim text, once per distinct value, or with pyarrow.compute for Arrow-backed text"""
+    if HAS_PYARROW and is_arrow_text(series):
+        values = pc.utf8_trim_whitespace(pc.utf8_lower(pa.array(series.array)))
+        return pd.Series(pd.array(values, dtype=series.dtype), index=series.index)
+    return map_distinct(series, lambda uniques: uniques.str.lower().str.strip())
+
+
+def convert_to_numeric(series):
+    """Convert a column to numbers, parsing each distinct value once; unparseable values become missing"""
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_numeric(series, errors='coerce')
+    return map_distinct(series, lambda uniques: pd.to_numeric(uniques, errors='coerce'))
+
+
+def group_fill_values(data, columns, group_column, method):
+    """Fill value of each column within each group, as a frame indexed by group with one column per input column"""
+    grouped = data.groupby(group_column, observed=True)[columns]
+    if method == "Group Mean":
+        return grouped.mean()
+    if method == "Group Median":
+        return grouped.median()
+    # Most frequent value of each column in each group; ties go to the smallest value, like Series.mode().
+    # Each (group, value) pair is encoded as one integer and counted by sorting.
+    group_codes, groups = pd.factorize(data[group_column], sort=True)
+    modes = {}
+    for col in columns:
+        value_codes, uniques = pd.factorize(data[col], sort=True)
+        valid = (group_codes >= 0) & (value_codes >= 0)
+        pairs, counts = np.unique(group_codes[valid].astype(np.int64) * len(uniques) + value_codes[valid], return_counts=True)
+        pair_groups, pair_values = np.divmod(pairs, max(len(uniques), 1))
+        order = np.lexsort((pair_values, -counts, pair_groups))
+        first = order[np.r_[True, pair_groups[order][1:] != pair_groups[order][:-1]]] if len(order) else order
+        modes[col] = pd.Series(uniques.take(pair_values[first]), index=groups.take(pair_groups[first]))
+    return pd.DataFrame(modes, index=groups, columns=columns)
+
+
+def interpolate_by_time(selected, times):
+    """Interpolate missing values linearly in the order of times (dates or numbers), weighting by the gaps between them"""
+    if is_text_column(times):
+        # CSV files load dates as text
+        try:
+            times = pd.to_datetime(times)
+        except (ValueError, TypeError):
+            raise ValueError("The time column must hold dates or numbers")
+    if pd.api.types.is_datetime64_any_dtype(times):
+        method = "time"
+    elif pd.api.types.is_numeric_dtype(times):
+        method = "index"
+    else:
+        raise ValueError("The time column must hold dates or numbers")
+    # Rows without a time are left as they are
+    valid = np.flatnonzero(times.notna().to_numpy())
+    positions = valid[np.argsort(times.iloc[valid].to_numpy(), kind="stable")]
+    result = selected.copy(deep=False)
+    missing = [col for col in selected.columns if selected[col].isna().any()]
+    if missing and len(positions):
+        ordered = selected[missing].iloc[positions].astype(float).set_axis(pd.Index(times.iloc[positions]))
+        interpolated = ordered.interpolate(method=method).to_numpy()
+        for i, col in enumerate(missing):
+            values = selected[col].to_numpy(dtype=float, na_value=np.nan, copy=True)
+            values[positions] = interpolated[:, i]
+            result[col] = values
+    return result
+
+
+def fit_onehot(data, columns, max_categories=None):
+    """Categories to encode for each column, keeping the max_categories most frequent.
+
+    Returns the categories and, per column, whether the remaining values go
+    to an "other" indicator.
+    """
+    categories, other = [], []
+    for col in columns:
+        counts = data[col].value_counts()
+        if max_categories and len(counts) > max_categories:
+            kept = counts.index[:max_categories]
+        else:
+            kept = data[col].dropna().unique()
+        categories.append([json_value(value) for value in kept])
+        other.append(len(counts) > len(kept))
+    return categories, other
+
+
+def onehot_bytes(data, columns, categories, other, sparse=False):
+    """Estimated memory of the indicator columns that One-Hot Encoding would create"""
+    if sparse:
+        return int(data[columns].notna().sum().sum()) * SPARSE_BYTES_PER_VALUE
+    return len(data) * sum(len(kept) + has_other for kept, has_other in zip(categories, other))
+
+
+def onehot_indicators(values, categories, has_other, prefix, sparse=False):
+    """Encode a column as uint8 indicator columns, one per category, in a single vectorized pass"""
+    codes = pd.Categorical(values, categories=categories).codes.astype(np.int64)
+    names = [f"{prefix}_{value}" for value in categories]
+    if has_other:
+        # Values outside the kept categories get the last indicator
+        codes[(codes < 0) & values.notna().to_numpy()] = len(categories)
+        names.append(f"{prefix}_{OTHER_CATEGORY}")
+    rows = np.flatnonzero(codes >= 0)
+    if sparse:
+        matrix = scipy.sparse.csc_matrix(
+            (np.ones(len(rows), dtype=np.uint8), (rows, codes[rows])), shape=(len(values), len(names))
+        )
+        return pd.DataFrame.sparse.from_spmatrix(matrix, index=values.index, columns=names)
+    indicators = np.zeros((len(values), len(names)), dtype=np.uint8)
+    indicators[rows, codes[rows]] = 1
+    return pd.DataFrame(indicators, index=values.index, columns=names)
+
+
+def fit_step(data, columns, action, params, sketches=None):
+    """Work out everything a cleaning action needs from the data.
+
+    Returns the recorded step (action, columns and fitted parameters), so it
+    can be applied again to new data without looking at this data, and the
+    columns the action does not apply to. sketches may map columns to
+    quantile sketches of them, used for IQR and MAD outlier bounds.
+    """
+    fill_method = params["fill_method"] if action == "Fill Missing Values" else None
+    numeric_only = action == "Remove Outliers" or fill_method in ["Mean", "Median", "Group Mean", "Group Median", "Time Interpolation"]
+    if numeric_only:
+        applicable = [col for col in columns if pd.api.types.is_numeric_dtype(data[col])]
+    elif action in ["Standardize Text", "One-Hot Encoding"]:
+        applicable = [col for col in columns if is_text_column(data[col])]
+    else:
+        applicable = list(columns)
+    if fill_method in GROUP_FILL_METHODS or fill_method == "Time Interpolation":
+        # The column that groups or orders the rows is not filled itself
+        key_column = params["group_column"] if fill_method in GROUP_FILL_METHODS else params["time_column"]
+        if key_column not in data.columns:
+            raise ValueError(f"{fill_method} needs a column to {'group' if fill_method in GROUP_FILL_METHODS else 'order'} the rows by")
+        applicable = [col for col in applicable if col != key_column]
+    skipped = [col for col in columns if col not in applicable]
+    if not applicable:
+        return None, skipped
+
+    selected = data[applicable]
+    fitted = {}
+
+    if action == "Fill Missing Values":
+        method = params["fill_method"]
+        fitted["method"] = method
+        if method == "Mean":
+            values = selected.mean()
+        elif method == "Median":
+            values = selected.median()
+        elif method == "Mode":
+            modes = selected.mode()
+            values = modes.iloc[0] if not modes.empty else pd.Series(None, index=applicable)
+        elif method == "Fixed Value":
+            fill_value = params["fill_value"]
+            # Numeric columns get the value as a number if it is one
+            try:
+                numeric_fill = float(fill_value)
+            except (TypeError, ValueError):
+                numeric_fill = fill_value
+            values = pd.Series([
+                numeric_fill if pd.api.types.is_numeric_dtype(selected[col]) else fill_value
+                for col in applicable
+            ], dtype=object)
+        elif method in GROUP_FILL_METHODS:
+            values = None
+            group_values = group_fill_values(data, applicable, params["group_column"], method)
+            fitted["group_column"] = params["group_column"]
+            fitted["groups"] = [json_value(group) for group in group_values.index]
+            # For each column, one value per group, in the order of the groups
+            fitted["values"] = [[json_value(value) for value in group_values[col].tolist()] for col in applicable]
+        elif method == "Time Interpolation":
+            values = None
+            fitted["time_column"] = params["time_column"]
+        else:
+            values = None
+        if values is not None:
+            # One value per column, in the order of the step's columns
+            fitted["values"] = [json_value(value) for value in values.tolist()]
+
+    elif action == "Remove Outliers":
+        threshold = params["outlier_threshold"]
+        method = params.get("outlier_method", "Standard Deviation")
+        fitted["method"] = method
+        fitted["threshold"] = threshold
+        if method == "Standard Deviation":
+            mean = selected.mean()
+            std = selected.std()
+            bounds = zip((mean - threshold * std).tolist(), (mean + threshold * std).tolist())
+        else:
+            bounds = [outlier_bounds(selected[col], method, threshold, (sketches or {}).get(col)) for col in applicable]
+        fitted["bounds"] = [[json_value(lower), json_value(upper)] for lower, upper in bounds]
+
+    elif action == "One-Hot Encoding":
+        sparse = bool(params.get("onehot_sparse"))
+        categories, other = fit_onehot(data, applicable, params.get("onehot_max_categories"))
+        size = onehot_bytes(data, applicable, categories, other, sparse)
+        if size > ONEHOT_MAX_BYTES:
+            raise ValueError(
+                f"One-Hot Encoding would create about {size / 1024 ** 2:,.0f} MB of indicator columns "
+                f"(limit {ONEHOT_MAX_BYTES / 1024 ** 2:,.0f} MB); lower the maximum categories or use sparse indicators"
+            )
+        fitted["categories"] = categories
+        fitted["other"] = other
+        fitted["sparse"] = sparse
+
+    return {"action": action, "columns": applicable, "params": fitted}, skipped
+
+
+def apply_step(data, step, carry=None):
+    """Apply a recorded cleaning step to a frame.
+
+    carry holds the last valid value of each column for Forward Fill when
+    data is one chunk of a longer file; it is updated for the next chunk.
+    """
+    action = step["action"]
+    columns = step["columns"]
+    fitted = step["params"]
+    # Unchanged columns are shared with the previous version (copy-on-write)
+    cleaned_data = data.copy(deep=False)
+    selected = cleaned_data[columns]
+
+    if action == "Fill Missing Values":
+        method = fitted["method"]
+        if method in ["Mean", "Median", "Group Mean", "Group Median"]:
+            # Averages are rarely whole numbers, so integer columns with gaps become float
+            selected = selected.astype({
+                col: float for col in columns
+                if pd.api.types.is_integer_dtype(selected[col]) and selected[col].isna().any()
+            })
+        if method == "Forward Fill":
+            filled = selected.ffill()
+            if carry is not None:
+                filled = filled.fillna({col: value for col, value in carry.items() if col in columns})
+                last_valid = filled.ffill().iloc[-1] if len(filled) else pd.Series(dtype=object)
+                carry.update({col: value for col, value in last_valid.items() if not pd.isna(value)})
+            cleaned_data[columns] = filled
+        elif method == "Backward Fill":
+            if carry is not None:
+                raise ValueError("Backward Fill needs later rows and cannot be replayed chunk by chunk")
+            cleaned_data[columns] = selected.bfill()
+        elif method in GROUP_FILL_METHODS:
+            keys = cleaned_data[fitted["group_column"]]
+            groups = pd.Index(fitted["groups"])
+            try:
+                # Match the group column's type, e.g. dates written as text in the recipe
+                groups = groups.astype(keys.dtype)
+            except (TypeError, ValueError):
+                pass
+            group_values = pd.DataFrame(dict(zip(columns, fitted["values"])), index=groups, columns=columns)
+            # Look up every row's group fill values for all columns at once
+            cleaned_data[columns] = selected.fillna(group_values.reindex(keys).set_axis(cleaned_data.index))
+        elif method == "Time Interpolation":
+            if carry is not None:
+                raise ValueError("Time Interpolation needs later rows and cannot be replayed chunk by chunk")
+            cleaned_data[columns] = interpolate_by_time(selected, cleaned_data[fitted["time_column"]])
+        else:
+            values = {col: value for col, value in zip(columns, fitted["values"]) if value is not None}
+            cleaned_data[columns] = selected.fillna(values)
+
+    # Remove rows with missing values in any of the columns
+    elif action == "Remove Missing Values":
+        cleaned_data = cleaned_data.dropna(subset=columns)
+
+    # Remove rows that are outside the fitted bounds in any of the columns
+    elif action == "Remove Outliers":
+        lower = pd.Series([bounds[0] for bounds in fitted["bounds"]], index=columns, dtype=float)
+        upper = pd.Series([bounds[1] for bounds in fitted["bounds"]], index=columns, dtype=float)
+        if not all(pd.api.types.is_numeric_dtype(selected[col]) for col in columns):
+            # A chunk read from a file may hold a stray string in a numeric column; it counts as missing
+            selected = pd.DataFrame({col: convert_to_numeric(selected[col]) for col in columns}, index=selected.index)
+        within = selected.ge(lower) & selected.le(upper)
+        cleaned_data = cleaned_data[within.all(axis=1)]
+
+    # Convert to numeric
+    elif action == "Convert to Numeric":
+        for col in columns:
+            cleaned_data[col] = convert_to_numeric(selected[col])
+
+    # Standardize text
+    elif action == "Standardize Text":
+        for col in columns:
+            # A chunk read from a file may hold only missing values or digits in a text column
+            if is_text_column(selected[col]):
+                cleaned_data[col] = standardize_text(selected[col])
+
+    # One-hot encoding, with one uint8 column per fitted category so every chunk gets the same columns
+    elif action == "One-Hot Encoding":
+        other = fitted.get("other", [False] * len(columns))
+        indicators = [
+            onehot_indicators(cleaned_data[col], categories, has_other, col, fitted.get("sparse", False))
+            for col, categories, has_other in zip(columns, fitted["categories"], other)
+        ]
+
+        # Replace the original columns with their indicators
+        cleaned_data = pd.concat([cleaned_data.drop(columns=columns), *indicators], axis=1)
+
+    else:
+        raise ValueError(f"Unknown cleaning action: {action}")
+
+    return cleaned_data
+
+
+def clean_columns(data, columns, action, params, sketches=None):
+    """Apply one cleaning action to several columns in a single vectorized pass.
+
+    Returns the cleaned frame, which shares all untouched columns with data,
+    the columns the action does not apply to, and the recorded step (None
+    if nothing was applied).
+    """
+    step, skipped = fit_step(data, columns, action, params, sketches)
+    if step is None:
+        return data, skipped, None
+    return apply_step(data, step), skipped, step
+
+
+def recipe_document(steps):
+    """The JSON-serializable form of a cleaning recipe"""
+    return {"version": RECIPE_VERSION, "steps": list(steps)}
+
+
+def recipe_steps(document):
+    """Check a loaded recipe document and return its steps"""
+    if not isinstance(document, dict) or document.get("version") != RECIPE_VERSION:
+        raise ValueError(f"Not a version {RECIPE_VERSION} cleaning recipe")
+    return document["steps"]
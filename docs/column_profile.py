@@ -0,0 +1,167 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from quantile_sketch import column_sketch, needs_sketch
+from cleaning_steps import is_text_column, convert_to_numeric
+
+# Number of column profiles kept in memory, across all sessions
+PROFILE_CACHE_SIZE = 256
+# Number of most frequent values kept in the profile of a non-numeric column
+PROFILE_TOP_VALUES = 20
+# Rows sampled when checking whether a text column holds numbers
+NUMERIC_CHECK_ROWS = 10_000
+# Number of histograms kept in memory, across all sessions
+HISTOGRAM_CACHE_SIZE = 256
+
+# Most recently used profiles last
+_profiles = OrderedDict()
+_profiles_lock = threading.Lock()
+
+_histograms = OrderedDict()
+
+# Cache hit and miss counters for this process
+profile_stats = {"hits": 0, "misses": 0}
+
+
+def numeric_moments(values):
+    """Mean, sample standard deviation, skewness and kurtosis from one centered copy of the values.
+
+    Skewness and kurtosis use the same bias-corrected formulas as pandas.
+    """
+    n = len(values)
+    mean = values.mean()
+    centered = values - mean
+    squared = centered ** 2
+    m2 = squared.sum()
+    std = np.sqrt(m2 / (n - 1)) if n > 1 else np.nan
+    if n < 3:
+        skew = np.nan
+    else:
+        skew = 0.0 if m2 == 0 else n * (n - 1) ** 0.5 / (n - 2) * (squared * centered).sum() / m2 ** 1.5
+    if n < 4:
+        kurtosis = np.nan
+    else:
+        denominator = (n - 2) * (n - 3) * m2 ** 2
+        kurtosis = 0.0 if denominator == 0 else (
+            n * (n + 1) * (n - 1) * (squared ** 2).sum() / denominator
+            - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3))
+        )
+    return mean, std, skew, kurtosis
+
+
+def compute_profile(series, sketch=None):
+    """Every statistic the cleaning and EDA outputs show for a column.
+
+    With a quantile sketch of the column, the quartiles and the IQR outlier
+    count are read from it instead of sorting the values.
+    """
+    rows = len(series)
+    missing = int(series.isna().sum())
+    profile = {
+        "dtype": str(series.dtype),
+        "rows": rows,
+        "count": rows - missing,
+        "missing": missing,
+        "missing_rate": missing / rows if rows else 0.0,
+        "numeric": pd.api.types.is_numeric_dtype(series),
+    }
+
+    if profile["numeric"]:
+        values = series.dropna().to_numpy(dtype=float)
+        if len(values):
+            if sketch is not None:
+                q1, median, q3 = sketch.quantile([0.25, 0.5, 0.75])
+                # Counting distinct values would mean sorting the whole column
+                nunique = None
+            else:
+                # Sorting releases the GIL, so columns can be profiled in parallel threads
+                values = np.sort(values)
+                q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+                nunique = 1 + int(np.count_nonzero(values[1:] != values[:-1]))
+            mean, std, skew, kurtosis = numeric_moments(values)
+            iqr = q3 - q1
+            if sketch is not None:
+                outliers = sketch.count_outside(q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+            else:
+                outliers = int(np.count_nonzero((values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)))
+            profile.update(min=values.min(), max=values.max(), q1=q1, median=median, q3=q3,
+                           mean=mean, std=std, skew=skew, kurtosis=kurtosis, iqr_outliers=outliers,
+                           nunique=nunique)
+        else:
+            profile.update({stat: np.nan for stat in ["min", "max", "q1", "median", "q3", "mean", "std", "skew", "kurtosis"]},
+                           iqr_outliers=0, nunique=0)
+    else:
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in "mM":
+            # Dates are counted by sorting rather than hashing, which also releases the GIL
+            uniques, frequencies = np.unique(series.dropna().to_numpy(), return_counts=True)
+            order = np.argsort(-frequencies, kind="stable")
+            counts = pd.Series(frequencies[order], index=pd.Index(uniques[order]))
+        else:
+            counts = series.value_counts()
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                # Categories left without rows (e.g. after removing rows) are not values of the column
+                counts = counts[counts > 0]
+        profile["nunique"] = len(counts)
+        profile["top_values"] = list(counts.head(PROFILE_TOP_VALUES).items())
+        if is_text_column(series) and rows:
+            # Share of rows that convert to a number, estimated from a bounded random sample of rows
+            if rows > NUMERIC_CHECK_ROWS:
+                series = series.iloc[np.random.default_rng(0).integers(0, rows, NUMERIC_CHECK_ROWS)]
+            profile["numeric_share"] = convert_to_numeric(series).notna().mean()
+    return profile
+
+
+def column_profile(key, series):
+    """Profile of a column, computed only once for each key.
+
+    The key must change whenever the column's values do, e.g. the key from
+    SessionValue.column_key() plus anything used to filter the rows. The
+    returned dict is shared and must not be modified.
+    """
+    with _profiles_lock:
+        profile = _profiles.get(key)
+        if profile is not None:
+            _profiles.move_to_end(key)
+            profile_stats["hits"] += 1
+            return profile
+        profile_stats["misses"] += 1
+
+    # Large numeric columns get approximate quantiles from a sketch that is cached under the same key
+    sketch = column_sketch(key, series) if needs_sketch(series) else None
+    profile = compute_profile(series, sketch)
+    with _profiles_lock:
+        _profiles[key] = profile
+        while len(_profiles) > PROFILE_CACHE_SIZE:
+            _profiles.popitem(last=False)
+    return profile
+
+
+def compute_histogram(series, bins):
+    """Bin edges and counts of the finite values of a numeric column"""
+    values = series.dropna().to_numpy(dtype=float)
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return np.array([0.0, 1.0]), np.zeros(1, dtype=np.int64)
+    counts, edges = np.histogram(values, bins=bins)
+    return edges, counts
+
+
+def column_histogram(key, series, bins):
+    """Bin edges and counts of a numeric column, computed only once for each key and number of bins.
+
+    Plots draw the counts as bars, so only the bins are sent to the browser
+    rather than every value.
+    """
+    with _profiles_lock:
+        histogram = _histograms.get((key, bins))
+        if histogram is not None:
+            _histograms.move_to_end((key, bins))
+            return histogram
+
+    histogram = compute_histogram(series, bins)
+    with _profiles_lock:
+        _histograms[(key, bins)] = histogram
+        while len(_histograms) > HISTOGRAM_CACHE_SIZE:
+            _histograms.popitem(last=False)
+    return histogram
@@ -1,16 +1,32 @@
 from shiny import ui, reactive, render
+import asyncio
 import pandas as pd
 import numpy as np
 import plotly.express as px
-from data_store import df_raw, df_cleaned, error_store, user_ab_variant
+import plotly.graph_objects as go
+from data_store import df_raw, df_cleaned, data_state, error_store, user_ab_variant, cleaning_recipe
+from cleaning_steps import clean_columns, recipe_document, is_text_column, fit_onehot, onehot_bytes
+from cleaning_steps import ONEHOT_WARN_BYTES, ONEHOT_MAX_BYTES
+from column_profile import column_profile, column_histogram
+from quantile_sketch import column_sketch, needs_sketch
+from quality_report import quality_report
+import json
 from shinywidgets import output_widget, render_widget
 
+# Number of bins in the column distribution histogram
+HISTOGRAM_BINS = 30
+
 # Data Cleaning UI
 data_cleaning_layout = ui.layout_sidebar(
         ui.sidebar(
             ui.div(
                 ui.h3("Data Cleaning Tools"),
                 ui.input_select("column_select", "Select Column", choices=[]),
+                ui.input_selectize(
+                    "batch_columns", "Batch Columns (optional)",
+                    choices=[], multiple=True,
+                    options={"placeholder": "Only the selected column"}
+                ),
                 ui.input_select(
                     "cleaning_action", "Select Cleaning Operation",
                     choices=[
@@ -22,26 +38,55 @@ data_cleaning_layout = ui.layout_sidebar(
                     "input.cleaning_action === 'Fill Missing Values'",
                     ui.input_select(
                         "fill_method", "Fill Method",
-                        choices=["Mean", "Median", "Mode", "Fixed Value", "Forward Fill", "Backward Fill"]
+                        choices=[
+                            "Mean", "Median", "Mode", "Fixed Value", "Forward Fill", "Backward Fill",
+                            "Group Mean", "Group Median", "Group Mode", "Time Interpolation"
+                        ]
                     ),
                     ui.panel_conditional(
                         "input.fill_method === 'Fixed Value'",
                         ui.input_text("fill_value", "Fill Value", "0")
+                    ),
+                    ui.panel_conditional(
+                        "input.fill_method.startsWith('Group')",
+                        ui.input_select("group_column", "Group By", choices=[])
+                    ),
+                    ui.panel_conditional(
+                        "input.fill_method === 'Time Interpolation'",
+                        ui.input_select("time_column", "Order By (Time Column)", choices=[])
                     )
                 ),
                 ui.panel_conditional(
                     "input.cleaning_action === 'Remove Outliers'",
-                    ui.input_slider("outlier_threshold", "Outlier Threshold (Standard Deviations)", 1.5, 5.0, 3.0, step=0.1)
+                    ui.input_select(
+                        "outlier_method", "Outlier Method",
+                        choices=["Standard Deviation", "IQR", "MAD"]
+                    ),
+                    ui.input_slider("outlier_threshold", "Outlier Threshold (Standard Deviations, IQRs or MADs)", 1.5, 5.0, 3.0, step=0.1)
+                ),
+                ui.panel_conditional(
+                    "input.cleaning_action === 'One-Hot Encoding'",
+                    ui.input_numeric("onehot_max_categories", "Max Categories per Column", 50, min=1),
+                    ui.input_checkbox("onehot_sparse", "Sparse indicators (less memory for many categories)", False),
+                    ui.output_ui("onehot_estimate")
                 ),
                 ui.br(),
                 ui.input_action_button("apply_cleaning", "Apply Cleaning", class_="btn-primary"),
                 ui.input_action_button("reset_data", "Reset Data", class_="btn-warning"),
+                ui.br(),
+                ui.br(),
+                ui.input_action_button("undo_cleaning", "Undo", class_="btn-secondary"),
+                ui.input_action_button("redo_cleaning", "Redo", class_="btn-secondary"),
+                ui.output_text("cleaning_history"),
+                ui.br(),
+                ui.download_button("download_recipe", "Download Recipe", class_="btn-secondary w-100"),
                 style="height: calc(100vh - 100px); overflow-y: auto; padding-right: 10px;"
             ),
             width=300
         ),
         ui.layout_columns(
             ui.card(
+                ui.output_ui("cleaning_sample_notice"),
                 ui.h3("Column Information"),
                 output_widget("column_distribution", height="300px"),
                 ui.output_ui("column_stats")
@@ -52,8 +97,13 @@ data_cleaning_layout = ui.layout_sidebar(
                 ui.h4("Cleaning Suggestions"),
                 ui.output_ui("cleaning_suggestions")
             ),
-            col_widths=[12, 12],  # Each card occupies the full row width
-            row_heights=[1, 2]    # Data preview card height is twice the column information card
+            ui.card(
+                ui.h3("Data Quality Report"),
+                ui.output_ui("quality_report_status"),
+                ui.output_table("quality_report_table")
+            ),
+            col_widths=[12, 12, 12],  # Each card occupies the full row width
+            row_heights=[1, 2, 2]     # Data preview card height is twice the column information card
         )
     )
 
@@ -63,7 +113,7 @@ def data_cleaning_server(input, output, session):
     def initialize_cleaned_data():
         raw_data = df_raw.get()
         if raw_data is not None and df_cleaned.get() is None:
-            df_cleaned.set(raw_data.copy())
+            df_cleaned.set(raw_data.copy(deep=False))
             # Make sure to update the UI when setting initial data
             sync_ui_with_data()
     
@@ -79,34 +129,63 @@ def data_cleaning_server(input, output, session):
             )
             print(f"Data Cleaning synced: {len(columns)} columns")
 
-    # Update column selection dropdown whenever the cleaned data changes
+    # Column names each effect below last offered, so choices are only sent when they change
+    offered_columns = {}
+
+    def offer_columns(source, columns):
+        """Offer the columns in the column select, keeping the selected column if it still exists"""
+        if offered_columns.get(source) == columns:
+            return False
+        offered_columns[source] = columns
+        with reactive.isolate():
+            current = input.column_select() if "column_select" in input else None
+        ui.update_select(
+            id="column_select",
+            choices=columns,
+            selected=current if current in columns else (columns[0] if columns else None)
+        )
+        return True
+
+    # Update column selection dropdown whenever the cleaned data's columns change
     @reactive.effect
     def update_column_choices():
         data = df_cleaned.get()
         if data is not None:
             columns = data.columns.tolist()
-            ui.update_select(
-                id="column_select",
-                choices=columns,
-                selected=columns[0] if columns else None
-            )
-            print(f"Updated column choices with {len(columns)} columns")
+            if offer_columns("update", columns):
+                print(f"Updated column choices with {len(columns)} columns")
 
     # Get currently selected column
     @reactive.calc
     def get_selected_column():
+        # Only invalidated when the selected column itself changes
+        return df_cleaned.column(input.column_select())
+
+    # Statistics of the selected column, shared by the outputs below and cached per column version
+    @reactive.calc
+    def get_selected_profile():
+        col_data = get_selected_column()
+        if col_data is None:
+            return None
+        return column_profile(df_cleaned.column_key(input.column_select()), col_data)
+
+    @output
+    @render.ui
+    def cleaning_sample_notice():
         data = df_cleaned.get()
-        col = input.column_select()
-        if data is not None and col in data.columns:
-            return data[col]
+        if data_state.get() == "sample" and data is not None:
+            return ui.div(
+                f"Working on a sample of {len(data):,} rows; cleaning applied now is replaced when the full dataset finishes loading.",
+                class_="alert alert-warning"
+            )
         return None
 
     # Column statistics
     @output
     @render.ui
     def column_stats():
-        col_data = get_selected_column()
-        if col_data is None:
+        profile = get_selected_profile()
+        if profile is None:
             return ui.p("No column selected or data is empty")
         
         # Create a title row
@@ -115,57 +194,47 @@ def data_cleaning_server(input, output, session):
         # Create a three-column layout row
         rows = []
         
-        if pd.api.types.is_numeric_dtype(col_data):
-            # Basic information row for numeric columns
-            row1 = ui.layout_columns(
-                ui.div(ui.p(f"Data Type: {col_data.dtype}")),
-                ui.div(ui.p(f"Non-null Values: {col_data.count()}/{len(col_data)}")),
-                ui.div(ui.p(f"Missing Values: {col_data.isna().sum()} ({col_data.isna().mean():.2%})")),
-                col_widths=[4, 4, 4]
-            )
-            rows.append(row1)
-            
+        # Basic information row
+        row1 = ui.layout_columns(
+            ui.div(ui.p(f"Data Type: {profile['dtype']}")),
+            ui.div(ui.p(f"Non-null Values: {profile['count']}/{profile['rows']}")),
+            ui.div(ui.p(f"Missing Values: {profile['missing']} ({profile['missing_rate']:.2%})")),
+            col_widths=[4, 4, 4]
+        )
+        rows.append(row1)
+        
+        if profile["numeric"]:
             # Numeric statistics row
             row2 = ui.layout_columns(
-                ui.div(ui.p(f"Minimum: {col_data.min():.4g}")),
-                ui.div(ui.p(f"Maximum: {col_data.max():.4g}")),
-                ui.div(ui.p(f"Mean: {col_data.mean():.4g}")),
+                ui.div(ui.p(f"Minimum: {profile['min']:.4g}")),
+                ui.div(ui.p(f"Maximum: {profile['max']:.4g}")),
+                ui.div(ui.p(f"Mean: {profile['mean']:.4g}")),
                 col_widths=[4, 4, 4]
             )
             rows.append(row2)
             
             # Additional statistics row
             row3 = ui.layout_columns(
-                ui.div(ui.p(f"Median: {col_data.median():.4g}")),
-                ui.div(ui.p(f"Standard Deviation: {col_data.std():.4g}")),
+                ui.div(ui.p(f"Median: {profile['median']:.4g}")),
+                ui.div(ui.p(f"Standard Deviation: {profile['std']:.4g}")),
                 ui.div(),  # Empty div to maintain symmetry
                 col_widths=[4, 4, 4]
             )
             rows.append(row3)
         else:
-            # Basic information row for categorical columns
-            row1 = ui.layout_columns(
-                ui.div(ui.p(f"Data Type: {col_data.dtype}")),
-                ui.div(ui.p(f"Non-null Values: {col_data.count()}/{len(col_data)}")),
-                ui.div(ui.p(f"Missing Values: {col_data.isna().sum()} ({col_data.isna().mean():.2%})")),
-                col_widths=[4, 4, 4]
-            )
-            rows.append(row1)
-            
             # Unique value information row
             row2 = ui.layout_columns(
-                ui.div(ui.p(f"Unique Value Count: {col_data.nunique()}")),
+                ui.div(ui.p(f"Unique Value Count: {profile['nunique']}")),
                 ui.div(),  # Empty div to maintain symmetry
                 ui.div(),  # Empty div to maintain symmetry
                 col_widths=[4, 4, 4]
             )
             rows.append(row2)
             
-            if col_data.nunique() < 10:
+            if profile["nunique"] < 10:
                 rows.append(ui.p("Top 5 Value Frequencies:"))
-                value_counts = col_data.value_counts().head(5)
-                for val, count in value_counts.items():
-                    rows.append(ui.p(f"- {val}: {count} ({count/len(col_data):.2%})"))
+                for val, count in profile["top_values"][:5]:
+                    rows.append(ui.p(f"- {val}: {count} ({count/profile['rows']:.2%})"))
         
         # Combine title and all rows
         return ui.div(stats[0], *rows)
@@ -180,21 +249,21 @@ def data_cleaning_server(input, output, session):
         
         try:
             if pd.api.types.is_numeric_dtype(col_data):
-                # Display histogram for numeric columns
-                fig = px.histogram(
-                    x=col_data,
+                # Display histogram for numeric columns, binned here so only the bars are sent
+                edges, counts = column_histogram(df_cleaned.column_key(input.column_select()), col_data, HISTOGRAM_BINS)
+                fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges)))
+                fig.update_layout(
                     title=f"Distribution of {input.column_select()}",
-                    labels={"x": input.column_select()},
-                    template="plotly_white"
+                    template="plotly_white",
+                    bargap=0
                 )
             else:
                 # Display bar chart for categorical columns
-                value_counts = col_data.value_counts().reset_index()
-                value_counts.columns = ["value", "count"]
+                profile = get_selected_profile()
+                value_counts = pd.DataFrame(profile["top_values"], columns=["value", "count"])
                 
                 # Limit to top 20 categories if there are too many
-                if len(value_counts) > 20:
-                    value_counts = value_counts.head(20)
+                if profile["nunique"] > 20:
                     title = f"Top 20 Categories in {input.column_select()}"
                 else:
                     title = f"Categories in {input.column_select()}"
@@ -225,14 +294,14 @@ def data_cleaning_server(input, output, session):
     @output
     @render.ui
     def cleaning_suggestions():
-        col_data = get_selected_column()
-        if col_data is None:
+        profile = get_selected_profile()
+        if profile is None:
             return ui.p("No column selected or data is empty")
         
         suggestions = []
         
         # Check for missing values
-        missing_rate = col_data.isna().mean()
+        missing_rate = profile["missing_rate"]
         if missing_rate > 0:
             if missing_rate > 0.5:
                 suggestions.append(ui.p(f"⚠️ This column has a high missing value rate of {missing_rate:.2%}, consider removing this column"))
@@ -240,40 +309,68 @@ def data_cleaning_server(input, output, session):
                 suggestions.append(ui.p(f"⚠️ This column has {missing_rate:.2%} missing values, consider filling or removing them"))
         
         # Suggestions for numeric columns
-        if pd.api.types.is_numeric_dtype(col_data):
-            # Check for outliers
-            q1 = col_data.quantile(0.25)
-            q3 = col_data.quantile(0.75)
-            iqr = q3 - q1
-            lower_bound = q1 - 1.5 * iqr
-            upper_bound = q3 + 1.5 * iqr
-            outliers = col_data[(col_data < lower_bound) | (col_data > upper_bound)]
-            if len(outliers) > 0:
-                suggestions.append(ui.p(f"⚠️ Detected {len(outliers)} outliers ({len(outliers)/len(col_data):.2%}), consider handling them"))
+        if profile["numeric"]:
+            # Check for outliers outside 1.5 IQR of the quartiles
+            outliers = profile["iqr_outliers"]
+            if outliers > 0:
+                suggestions.append(ui.p(f"⚠️ Detected {outliers} outliers ({outliers/profile['rows']:.2%}), consider handling them"))
             
             # Check if standardization is needed
-            if col_data.std() > 10 * col_data.mean():
+            if profile["std"] > 10 * profile["mean"]:
                 suggestions.append(ui.p("⚠️ Data has a wide range, consider standardization or normalization"))
         
         # Suggestions for categorical columns
         else:
             # Check for high cardinality
-            unique_count = col_data.nunique()
+            unique_count = profile["nunique"]
             if unique_count > 100:
                 suggestions.append(ui.p(f"⚠️ This column has high cardinality ({unique_count} unique values), consider grouping or encoding"))
             
             # Check for potential numeric columns
-            if col_data.dtype == 'object':
-                # Try to convert to numeric
-                numeric_conversion = pd.to_numeric(col_data, errors='coerce')
-                if numeric_conversion.notna().mean() > 0.8:  # If more than 80% can be converted
-                    suggestions.append(ui.p("⚠️ This column appears to contain numeric values, consider converting to numeric type"))
+            if profile.get("numeric_share", 0) > 0.8:  # If more than 80% can be converted
+                suggestions.append(ui.p("⚠️ This column appears to contain numeric values, consider converting to numeric type"))
         
         if not suggestions:
             suggestions.append(ui.p("✅ No specific cleaning suggestions for this column"))
         
         return ui.div(*suggestions)
 
+    # Quality measures of every column, computed in the background whenever the data changes
+    @reactive.extended_task
+    async def quality_task(keys, data):
+        return await asyncio.to_thread(quality_report, keys, data)
+
+    @reactive.effect
+    def start_quality_report():
+        data = df_cleaned.get()
+        if data is None:
+            return
+        # A report for an earlier version is out of date; invoke() would queue behind it
+        quality_task.cancel()
+        quality_task.invoke([df_cleaned.column_key(col) for col in data.columns], data)
+
+    @output
+    @render.ui
+    def quality_report_status():
+        status = quality_task.status()
+        if status == "running":
+            return ui.p("Checking all columns...")
+        if status == "error":
+            return ui.p(f"Quality report failed: {quality_task.error.get()}")
+        return None
+
+    @output
+    @render.table
+    def quality_report_table():
+        if quality_task.status() != "success":
+            return pd.DataFrame()
+        report = quality_task.value.get().copy()
+        report["Missing"] = report["Missing"].map("{:.1%}".format)
+        report["Outliers (IQR)"] = report["Outliers (IQR)"].map(lambda share: "" if pd.isna(share) else f"{share:.1%}")
+        # Not counted for numeric columns large enough to use a quantile sketch
+        report["Unique Values"] = report["Unique Values"].map(lambda count: "" if pd.isna(count) else f"{int(count):,}")
+        return report
+
     # Data preview
     @output
     @render.table
@@ -289,96 +386,109 @@ def data_cleaning_server(input, output, session):
     def reset_data():
         raw_data = df_raw.get()
         if raw_data is not None:
-            df_cleaned.set(raw_data.copy())
+            # Shares the original columns until they are changed again
+            df_cleaned.set(raw_data.copy(deep=False), label="Reset Data")
+            cleaning_recipe.set([], label="Reset Data")
             error_store.set("Data has been reset to original state")
             # Make sure to update the UI after resetting
             sync_ui_with_data()
 
-    # Apply cleaning operation
+    # Undo and redo cleaning operations
+    @reactive.effect
+    @reactive.event(input.undo_cleaning)
+    def undo_cleaning():
+        label = df_cleaned.undo()
+        if label:
+            cleaning_recipe.undo()
+        error_store.set(f"Undone: {label}" if label else "Nothing to undo")
+
+    @reactive.effect
+    @reactive.event(input.redo_cleaning)
+    def redo_cleaning():
+        label = df_cleaned.redo()
+        if label:
+            cleaning_recipe.redo()
+        error_store.set(f"Redone: {label}" if label else "Nothing to redo")
+
+    @output
+    @render.text
+    def cleaning_history():
+        undo, redo = df_cleaned.history()
+        if not undo and not redo:
+            return ""
+        last = f", last: {undo[-1]}" if undo else ""
+        return f"{len(undo)} step(s) to undo, {len(redo)} to redo{last}"
+
+    # Apply cleaning operation to the selected column, or to all batch columns at once
     @reactive.effect
     @reactive.event(input.apply_cleaning)
     def apply_cleaning_operation():
         data = df_cleaned.get()
-        col = input.column_select()
         action = input.cleaning_action()
+        columns = list(batch_selection() or []) or [input.column_select()]
         
-        if data is None or col not in data.columns:
+        if data is None or not all(col in data.columns for col in columns):
             error_store.set("No data or column selected")
             return
         
+        params = {
+            "fill_method": input.fill_method(),
+            "fill_value": input.fill_value(),
+            "outlier_threshold": input.outlier_threshold(),
+            "outlier_method": input.outlier_method(),
+            "group_column": input.group_column(),
+            "time_column": input.time_column(),
+            "onehot_max_categories": input.onehot_max_categories(),
+            "onehot_sparse": input.onehot_sparse(),
+        }
+        
         try:
-            cleaned_data = data.copy()
+            # Quantile-based outlier bounds of large columns come from sketches cached per column version
+            sketches = {}
+            if action == "Remove Outliers" and params["outlier_method"] != "Standard Deviation":
+                sketches = {col: column_sketch(df_cleaned.column_key(col), data[col]) for col in columns if needs_sketch(data[col])}
+            cleaned_data, skipped, step = clean_columns(data, columns, action, params, sketches)
             
-            # Fill missing values
-            if action == "Fill Missing Values":
-                method = input.fill_method()
-                
-                if method == "Mean" and pd.api.types.is_numeric_dtype(cleaned_data[col]):
-                    cleaned_data[col] = cleaned_data[col].fillna(cleaned_data[col].mean())
-                
-                elif method == "Median" and pd.api.types.is_numeric_dtype(cleaned_data[col]):
-                    cleaned_data[col] = cleaned_data[col].fillna(cleaned_data[col].median())
-                
-                elif method == "Mode":
-                    mode_value = cleaned_data[col].mode()[0] if not cleaned_data[col].mode().empty else None
-                    cleaned_data[col] = cleaned_data[col].fillna(mode_value)
-                
-                elif method == "Fixed Value":
-                    fill_value = input.fill_value()
-                    # Try to convert to numeric if the column is numeric
-                    if pd.api.types.is_numeric_dtype(cleaned_data[col]):
-                        try:
-                            fill_value = float(fill_value)
-                        except ValueError:
-                            pass
-                    cleaned_data[col] = cleaned_data[col].fillna(fill_value)
-                
-                elif method == "Forward Fill":
-                    cleaned_data[col] = cleaned_data[col].ffill()
-                
-                elif method == "Backward Fill":
-                    cleaned_data[col] = cleaned_data[col].bfill()
-            
-            # Remove missing values
-            elif action == "Remove Missing Values":
-                cleaned_data = cleaned_data.dropna(subset=[col])
-            
-            # Remove outliers
-            elif action == "Remove Outliers" and pd.api.types.is_numeric_dtype(cleaned_data[col]):
-                threshold = input.outlier_threshold()
-                mean = cleaned_data[col].mean()
-                std = cleaned_data[col].std()
-                lower_bound = mean - threshold * std
-                upper_bound = mean + threshold * std
-                cleaned_data = cleaned_data[(cleaned_data[col] >= lower_bound) & (cleaned_data[col] <= upper_bound)]
-            
-            # Convert to numeric
-            elif action == "Convert to Numeric":
-                cleaned_data[col] = pd.to_numeric(cleaned_data[col], errors='coerce')
-            
-            # Standardize text
-            elif action == "Standardize Text" and cleaned_data[col].dtype == 'object':
-                cleaned_data[col] = cleaned_data[col].str.lower().str.strip()
-            
-            # One-hot encoding
-            elif action == "One-Hot Encoding" and cleaned_data[col].dtype == 'object':
-                # Get unique values
-                unique_values = cleaned_data[col].dropna().unique()
-                
-                # Create a new column for each unique value
-                for value in unique_values:
-                    new_col = f"{col}_{value}"
-                    cleaned_data[new_col] = (cleaned_data[col] == value).astype(int)
-                
-                # Remove original column
-                cleaned_data = cleaned_data.drop(columns=[col])
-            
-            # Update cleaned data
-            df_cleaned.set(cleaned_data)
+            # Update cleaned data and record the step with the values it was fitted with
+            label = f"{action} ({columns[0]})" if len(columns) == 1 else f"{action} ({len(columns)} columns)"
+            if df_cleaned.set(cleaned_data, label=label):
+                steps = cleaning_recipe.get()
+                cleaning_recipe.set([*steps, step] if step else list(steps), label=label)
+            if skipped:
+                error_store.set(f"{action} does not apply to: {', '.join(map(str, skipped))}")
             
         except Exception as e:
             error_store.set(f"Cleaning operation failed: {str(e)}") 
 
+    # Size of the indicator columns One-Hot Encoding would create, shown before applying it
+    @output
+    @render.ui
+    def onehot_estimate():
+        if input.cleaning_action() != "One-Hot Encoding":
+            return None
+        columns = list(batch_selection() or []) or [input.column_select()]
+        data = df_cleaned.get_columns(columns)
+        if data is None:
+            return None
+        columns = [col for col in data.columns if is_text_column(data[col])]
+        if not columns:
+            return ui.p("No text columns selected")
+        categories, other = fit_onehot(data, columns, input.onehot_max_categories())
+        size = onehot_bytes(data, columns, categories, other, input.onehot_sparse())
+        message = (f"Creates {sum(len(kept) + has_other for kept, has_other in zip(categories, other)):,} "
+                   f"indicator columns, about {size / 1024 ** 2:,.1f} MB")
+        if size > ONEHOT_MAX_BYTES:
+            return ui.div(f"{message}, over the {ONEHOT_MAX_BYTES / 1024 ** 2:,.0f} MB limit. Lower the maximum categories or use sparse indicators.",
+                          class_="alert alert-danger")
+        if size > ONEHOT_WARN_BYTES:
+            return ui.div(f"{message}. Consider fewer categories or sparse indicators.", class_="alert alert-warning")
+        return ui.p(message)
+
+    # Recorded cleaning steps, replayable on new files with recipe_runner.py
+    @render.download(filename=lambda: "cleaning_recipe.json")
+    def download_recipe():
+        return json.dumps(recipe_document(cleaning_recipe.get()), indent=2, default=str)
+
     @reactive.calc
     def data_state_monitor():
         """Monitor data state to ensure UI is synchronized with data"""
@@ -387,16 +497,29 @@ def data_cleaning_server(input, output, session):
             return {"has_data": True, "columns": data.columns.tolist()}
         return {"has_data": False, "columns": []}
 
+    def batch_selection():
+        return input.batch_columns() if "batch_columns" in input else None
+
+    # Keep batch, group and time column choices in step with the data, preserving the selection
+    @reactive.effect
+    def update_batch_choices():
+        columns = data_state_monitor()["columns"]
+        if offered_columns.get("batch") == columns:
+            return
+        offered_columns["batch"] = columns
+        with reactive.isolate():
+            selected = [col for col in (batch_selection() or []) if col in columns]
+            group_column = input.group_column() if input.group_column() in columns else None
+            time_column = input.time_column() if input.time_column() in columns else None
+        ui.update_selectize("batch_columns", choices=columns, selected=selected)
+        ui.update_select("group_column", choices=columns, selected=group_column)
+        ui.update_select("time_column", choices=columns, selected=time_column)
+
     @reactive.effect
     def sync_ui_with_data_state():
         """Synchronize UI with data state"""
         state = data_state_monitor()
-        if state["has_data"]:
-            ui.update_select(
-                id="column_select",
-                choices=state["columns"],
-                selected=state["columns"][0] if state["columns"] else None
-            )
+        if state["has_data"] and offer_columns("monitor", state["columns"]):
             print(f"B version monitor: Updated column choices with {len(state['columns'])} columns")
 
 data_cleaning_ui = ui.nav_panel("Data Cleaning", data_cleaning_layout)
@@ -1,5 +1,5 @@
 from shiny import ui, reactive, render
-from data_store import df_cleaned, error_store, user_ab_variant
+from data_store import df_cleaned, data_state, error_store, user_ab_variant
 import pandas as pd
 import io
 import json
@@ -16,6 +16,7 @@ except ImportError:
 # Data Download UI
 data_download_layout = ui.div(
     ui.card_header(ui.h3("Download Processed Data")),
+    ui.output_ui("download_sample_notice"),
     ui.layout_columns(
         ui.value_box(
             "Data Status",
@@ -110,6 +111,17 @@ data_download_layout = ui.div(
 )
 
 def data_download_server(input, output, session):
+    @output
+    @render.ui
+    def download_sample_notice():
+        data = df_cleaned.get()
+        if data_state.get() == "sample" and data is not None:
+            return ui.div(
+                f"Only a sample of {len(data):,} rows is loaded; downloads will contain the sample, not the full dataset.",
+                class_="alert alert-warning"
+            )
+        return None
+
     # Data status
     @output
     @render.text
@@ -119,6 +131,8 @@ def data_download_server(input, output, session):
             return "No data loaded"
         elif data.empty:
             return "Data is empty"
+        elif data_state.get() == "sample":
+            return "Sample only"
         else:
             return "Data is ready"
     
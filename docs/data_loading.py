@@ -1,11 +1,23 @@
 from shiny import ui, reactive, render
-from data_store import df_raw, df_cleaned, error_store, user_ab_variant
+from data_store import df_raw, df_cleaned, data_state, error_store, user_ab_variant, cleaning_recipe
+from data_store import current_session_id, session_bytes, memory_totals, MEMORY_BUDGET_BYTES
+from data_store import get_shared_frame, share_frame, shared_bytes
+from ingest_cache import cache_key, load_cached, store_cached, cache_stats
+from sample_datasets import get_sample_dataset, SYNTHETIC_MAX_ROWS, SYNTHETIC_MAX_COLS
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 import time
 import pandas as pd
 import numpy as np
 import json
 import os
 import io
+import gzip
+import bz2
+import lzma
+import zipfile
 
 # Check if pyreadr library is installed for reading RDS files
 try:
@@ -14,6 +26,587 @@ try:
 except ImportError:
     HAS_PYREADR = False
 
+# Check if pyarrow library is installed for fast CSV parsing and columnar formats
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather as pa_feather
+    import pyarrow.parquet as pa_parquet
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Check if zstandard library is installed for reading .zst files
+try:
+    import zstandard
+    HAS_ZSTANDARD = True
+except ImportError:
+    HAS_ZSTANDARD = False
+
+# Check if orjson library is installed for faster JSON parsing
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Bytes read from disk per block when streaming CSV files with pyarrow
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+# Rows per chunk when streaming CSV files with the pandas parser
+CSV_CHUNK_ROWS = 200_000
+
+# Approximate bytes of lines parsed per batch when streaming NDJSON files
+NDJSON_BATCH_BYTES = 32 * 1024 * 1024
+
+# Files larger than this get a quick sampled preview while the full file loads
+PREVIEW_THRESHOLD_BYTES = int(os.environ.get("PREVIEW_THRESHOLD_MB", "100")) * 1024 * 1024
+# Rows read for the sampled preview
+PREVIEW_ROWS = 10_000
+
+# Columnar file extensions and the Arrow format they are stored in
+COLUMNAR_FORMATS = {
+    "parquet": "parquet",
+    "pq": "parquet",
+    "feather": "ipc",
+    "arrow": "ipc",
+    "ipc": "ipc",
+}
+
+# Compressed file extensions and the codec used to decompress them
+COMPRESSION_EXTENSIONS = {
+    "gz": "gzip",
+    "bz2": "bz2",
+    "xz": "xz",
+    "zst": "zstd",
+    "zip": "zip",
+}
+
+# File extensions that can be uploaded
+SUPPORTED_EXTENSIONS = ["csv", "json", "ndjson", "jsonl", "xlsx", "xls", "rds", *COLUMNAR_FORMATS]
+# File extensions whose first rows can be read without parsing the whole file
+SAMPLEABLE_EXTENSIONS = ["csv", "ndjson", "jsonl", *COLUMNAR_FORMATS]
+# Compressed files can only be sampled from the start of the stream
+STREAM_SAMPLEABLE_EXTENSIONS = ["csv", "ndjson", "jsonl"]
+
+# Text columns with at most this share of distinct values are stored as categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+
+def split_file_name(file_name):
+    """Return the data format extension and compression codec of an uploaded file name"""
+    parts = file_name.lower().split(".")
+    if parts[-1] in COMPRESSION_EXTENSIONS:
+        compression = COMPRESSION_EXTENSIONS[parts[-1]]
+        # e.g. data.csv.gz; the format of a plain .zip comes from the file inside it
+        file_ext = parts[-2] if len(parts) > 2 else None
+        return file_ext, compression
+    return parts[-1], None
+
+
+def zip_member_name(archive):
+    """Return the name of the data file inside a zip archive"""
+    names = [name for name in archive.namelist() if not name.endswith("/") and not name.startswith("__MACOSX/")]
+    if not names:
+        raise ValueError("Zip archive is empty")
+    return names[0]
+
+
+def upload_format(file_name, file_path):
+    """Return the data format extension and compression codec of an uploaded file"""
+    file_ext, compression = split_file_name(file_name)
+    if compression == "zip":
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                file_ext = zip_member_name(archive).lower().split(".")[-1]
+        except (zipfile.BadZipFile, ValueError):
+            file_ext = None
+    return file_ext, compression
+
+
+@contextmanager
+def open_upload(file_path, compression=None):
+    """Open a file for streaming reads, decompressing it on the fly.
+
+    Yields the readable binary stream and a function returning the fraction of
+    the file on disk read so far.
+    """
+    total_bytes = max(os.path.getsize(file_path), 1)
+    with open(file_path, "rb") as raw:
+        def fraction_read():
+            return min(raw.tell() / total_bytes, 1.0)
+
+        if compression is None:
+            yield raw, fraction_read
+        elif compression == "gzip":
+            with gzip.GzipFile(fileobj=raw) as f:
+                yield f, fraction_read
+        elif compression == "bz2":
+            with bz2.BZ2File(raw) as f:
+                yield f, fraction_read
+        elif compression == "xz":
+            with lzma.LZMAFile(raw) as f:
+                yield f, fraction_read
+        elif compression == "zstd":
+            with zstandard.ZstdDecompressor().stream_reader(raw, closefd=False) as reader:
+                yield io.BufferedReader(reader), fraction_read
+        elif compression == "zip":
+            with zipfile.ZipFile(raw) as archive:
+                with archive.open(zip_member_name(archive)) as f:
+                    yield f, fraction_read
+        else:
+            raise ValueError(f"Unsupported compression: {compression}")
+
+
+def dedup_column_names(names):
+    """Rename repeated column names to name.1, name.2, ... the way pd.read_csv does"""
+    counts = {}
+    names = list(names)
+    for i, name in enumerate(names):
+        count = counts.get(name, 0)
+        original = name
+        while count > 0:
+            counts[original] = count + 1
+            name = f"{original}.{count}"
+            # Skip suffixes that another column already has
+            count = count + 1 if name in names else counts.get(name, 0)
+        names[i] = name
+        counts[name] = count + 1
+    return names
+
+
+class PrefixedStream(io.RawIOBase):
+    """A binary stream that returns bytes already read from another stream before the rest of it"""
+
+    def __init__(self, prefix, stream):
+        self._prefix = memoryview(prefix)
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if len(self._prefix):
+            n = min(len(buffer), len(self._prefix))
+            buffer[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def read_csv_arrow(f, report):
+    """Read a CSV stream block by block with pyarrow.
+
+    Dates and times are kept as text, as pd.read_csv does for the preview
+    sample and the fallback parser, so a column's type does not depend on
+    which reader loaded it.
+    """
+    read_options = pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE)
+    # pyarrow infers column types from the first block, so that block is
+    # parsed on its own first to find the date and time columns
+    first_block = f.read(CSV_BLOCK_SIZE)
+    # Leave out a last line that continues in the next block
+    complete = first_block[:first_block.rfind(b"\n") + 1] if len(first_block) == CSV_BLOCK_SIZE else first_block
+    schema = pa_csv.open_csv(io.BytesIO(complete or first_block), read_options=read_options).schema
+    temporal = {field.name: pa.string() for field in schema if pa.types.is_temporal(field.type)}
+    reader = pa_csv.open_csv(
+        PrefixedStream(first_block, f),
+        read_options=read_options,
+        convert_options=pa_csv.ConvertOptions(strings_can_be_null=True, column_types=temporal),
+    )
+    batches = []
+    for batch in reader:
+        batches.append(batch)
+        report()
+    table = pa.Table.from_batches(batches, schema=reader.schema)
+    del batches
+    # pyarrow keeps repeated header names, which would make df[name] a DataFrame
+    if len(set(table.column_names)) < table.num_columns:
+        table = table.rename_columns(dedup_column_names(table.column_names))
+    # Free each Arrow column as soon as it has been converted, so the
+    # data is never held twice in memory
+    return table.to_pandas(split_blocks=True, self_destruct=True, date_as_object=False)
+
+
+def read_csv_chunks(f, report):
+    """Read a CSV stream in bounded chunks of rows with pandas"""
+    chunks = []
+    for chunk in pd.read_csv(f, chunksize=CSV_CHUNK_ROWS):
+        chunks.append(chunk)
+        report()
+    if not chunks:
+        return pd.DataFrame()
+    df = pd.concat(chunks, ignore_index=True)
+    del chunks
+    return df
+
+
+def json_loads(data):
+    """Parse JSON text or bytes, using orjson when it is available"""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def flatten_json(json_data):
+    """Build a DataFrame from parsed JSON, expanding nested objects into dotted columns"""
+    if isinstance(json_data, dict):
+        # One row per top-level key, with nested objects flattened to any depth
+        return pd.json_normalize([{key: value} for key, value in json_data.items()])
+    if isinstance(json_data, list):
+        if json_data and all(isinstance(record, dict) for record in json_data):
+            return pd.json_normalize(json_data)
+        return pd.DataFrame(json_data)
+    raise ValueError("Unsupported JSON format")
+
+
+def parse_json_lines(lines):
+    # Parse a batch of records in one call by joining the lines into an array
+    return flatten_json(json_loads(b"[" + b",".join(lines) + b"]"))
+
+
+def read_ndjson_streaming(f, report):
+    """Read a line-delimited JSON stream in batches of records"""
+    frames = []
+    while True:
+        lines = f.readlines(NDJSON_BATCH_BYTES)
+        if not lines:
+            break
+        lines = [line for line in lines if line.strip()]
+        if lines:
+            frames.append(parse_json_lines(lines))
+        report()
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    del frames
+    return df
+
+
+def read_columnar_schema(file_path, file_ext):
+    """Return the column names of a Parquet/Feather/Arrow file without reading its data"""
+    if COLUMNAR_FORMATS[file_ext] == "parquet":
+        return pa_parquet.read_schema(file_path, memory_map=True).names
+    with pa.memory_map(file_path) as source:
+        try:
+            return pa.ipc.open_file(source).schema.names
+        except pa.ArrowInvalid:
+            # Arrow IPC stream format rather than file format
+            source.seek(0)
+            return pa.ipc.open_stream(source).schema.names
+
+
+def read_columnar(source, file_ext, columns=None, on_progress=None):
+    """Read a Parquet/Feather/Arrow file path or in-memory buffer, loading only the requested columns.
+
+    Parquet files are read one row group at a time, calling on_progress with
+    the fraction read after each; other formats report once they are read.
+    """
+    columns = list(columns) if columns else None
+    # Files on disk are memory-mapped, so unselected columns are never paged in
+    memory_map = isinstance(source, str)
+    if COLUMNAR_FORMATS[file_ext] == "parquet":
+        parquet_file = pa_parquet.ParquetFile(source, memory_map=memory_map)
+        groups = []
+        for i in range(parquet_file.num_row_groups):
+            groups.append(parquet_file.read_row_group(i, columns=columns))
+            if on_progress is not None:
+                on_progress((i + 1) / parquet_file.num_row_groups)
+        table = pa.concat_tables(groups) if groups else parquet_file.schema_arrow.empty_table()
+        if columns and not groups:
+            table = table.select(columns)
+        del groups
+    else:
+        try:
+            table = pa_feather.read_table(source, columns=columns, memory_map=memory_map)
+        except pa.ArrowInvalid:
+            # Arrow IPC stream format rather than file format
+            stream = pa.memory_map(source) if memory_map else source
+            stream.seek(0)
+            table = pa.ipc.open_stream(stream).read_all()
+            if columns:
+                table = table.select(columns)
+        if on_progress is not None:
+            on_progress(1.0)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def file_format_error(file_ext, compression=None):
+    """Return an error message if a file with this extension and compression cannot be read, otherwise None"""
+    if file_ext not in SUPPORTED_EXTENSIONS:
+        return f"Unsupported file type: {file_ext}. Supported formats: CSV, JSON, NDJSON, Excel, RDS, Parquet, Feather, Arrow"
+    if file_ext == "rds" and not HAS_PYREADR:
+        return "Missing pyreadr library, cannot read RDS files. Please install: pip install pyreadr"
+    if file_ext == "rds" and compression is not None:
+        return "Compressed RDS files are not supported; RDS files are already compressed, please upload the .rds file directly"
+    if file_ext in COLUMNAR_FORMATS and not HAS_PYARROW:
+        return "Missing pyarrow library, cannot read Parquet/Feather/Arrow files. Please install: pip install pyarrow"
+    if compression == "zstd" and not HAS_ZSTANDARD:
+        return "Missing zstandard library, cannot read .zst files. Please install: pip install zstandard"
+    return None
+
+
+def read_excel_sheet_names(source):
+    """List the worksheets of an Excel file without reading their cells"""
+    with pd.ExcelFile(source) as workbook:
+        return workbook.sheet_names
+
+
+def read_excel_sheet(source, sheet_name):
+    # pandas opens .xlsx workbooks with openpyxl in read-only mode, streaming rows
+    return pd.read_excel(source, sheet_name=sheet_name)
+
+
+def read_excel_sheets(source, sheet_names=None, concat_sheets=False, on_progress=None):
+    """Read the selected worksheets of an Excel file path or buffer.
+
+    Several sheets of a file on disk are parsed in parallel processes.
+    """
+    if not sheet_names:
+        return read_excel_sheet(source, 0)
+    if len(sheet_names) == 1:
+        return read_excel_sheet(source, sheet_names[0])
+
+    frames = {}
+    if isinstance(source, str):
+        executor = ProcessPoolExecutor(max_workers=min(len(sheet_names), os.cpu_count() or 1))
+        try:
+            futures = {executor.submit(read_excel_sheet, source, name): name for name in sheet_names}
+            for future in as_completed(futures):
+                frames[futures[future]] = future.result()
+                if on_progress is not None:
+                    on_progress(len(frames) / len(sheet_names))
+        except BaseException:
+            # On cancel or error, return without waiting for the remaining sheets to be parsed
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+    else:
+        frames = pd.read_excel(source, sheet_name=list(sheet_names))
+    frames = [frames[name] for name in sheet_names]
+
+    if concat_sheets:
+        # Stack sheets that share a schema, recording which sheet each row came from
+        mismatched = [name for name, frame in zip(sheet_names, frames) if list(frame.columns) != list(frames[0].columns)]
+        if mismatched:
+            raise ValueError(f"Sheets do not have the same columns as '{sheet_names[0]}': {', '.join(mismatched)}")
+        df = pd.concat(frames, keys=sheet_names, names=["sheet", None]).reset_index(level="sheet")
+        return df.reset_index(drop=True)
+
+    # Otherwise place the sheets side by side as "sheet.column"
+    return pd.concat([frame.add_prefix(f"{name}.") for name, frame in zip(sheet_names, frames)], axis=1)
+
+
+def read_blocks(f, report):
+    """Read a whole stream into bytes a block at a time, calling report after each block"""
+    blocks = []
+    for block in iter(lambda: f.read(CSV_BLOCK_SIZE), b""):
+        blocks.append(block)
+        report()
+    return b"".join(blocks)
+
+
+def parse_file(file_path, file_ext, options=None, on_progress=None):
+    """Parse an uploaded file into a DataFrame based on its extension and parse options"""
+    options = options or {}
+    compression = options.get("compression")
+
+    # Formats parsed in one call report only once they are read, so a
+    # cancelled load stops before any further work
+    def parsed():
+        if on_progress is not None:
+            on_progress(1.0)
+
+    if file_ext == "rds":
+        # Use pyreadr to read RDS file
+        result = pyreadr.read_r(file_path)
+        parsed()
+        # RDS files usually contain one dataframe, we get the first one
+        if result:
+            return next(iter(result.values()))
+        raise ValueError("RDS file is empty or format is incorrect")
+
+    if file_ext in ["xlsx", "xls"] and compression is None:
+        # Read the selected Excel sheets, or the first sheet
+        df = read_excel_sheets(file_path, options.get("sheets"), options.get("concat_sheets", False), on_progress)
+        parsed()
+        return df
+
+    if file_ext in COLUMNAR_FORMATS and compression is None:
+        # Read Parquet, Feather or Arrow IPC file
+        return read_columnar(file_path, file_ext, options.get("columns"), on_progress)
+
+    if file_ext == "csv" and HAS_PYARROW:
+        try:
+            with open_upload(file_path, compression) as (f, fraction_read):
+                return read_csv_arrow(f, lambda: on_progress and on_progress(fraction_read()))
+        except pa.ArrowInvalid:
+            # pyarrow infers column types from the first block only; fall back to
+            # the pandas parser when a later block does not match
+            pass
+
+    with open_upload(file_path, compression) as (f, fraction_read):
+        def report():
+            if on_progress is not None:
+                on_progress(fraction_read())
+
+        if file_ext == "csv":
+            # Stream the file so progress reflects the bytes parsed so far
+            return read_csv_chunks(f, report)
+
+        if file_ext == "json":
+            json_data = json_loads(read_blocks(f, report))
+            report()
+            return flatten_json(json_data)
+
+        if file_ext in ["ndjson", "jsonl"]:
+            # Stream line-delimited records in batches
+            return read_ndjson_streaming(f, report)
+
+        # Excel and columnar formats need random access, so compressed files
+        # are decompressed into memory rather than into a temporary file
+        if file_ext in ["xlsx", "xls"]:
+            df = read_excel_sheets(io.BytesIO(read_blocks(f, report)), options.get("sheets"), options.get("concat_sheets", False))
+            parsed()
+            return df
+
+        if file_ext in COLUMNAR_FORMATS:
+            return read_columnar(pa.BufferReader(read_blocks(f, report)), file_ext, options.get("columns"), on_progress)
+
+    raise ValueError(f"Unsupported file type: {file_ext}")
+
+
+def read_sample(file_path, file_ext, options=None, n_rows=PREVIEW_ROWS):
+    """Read the first rows of a large file for a quick preview"""
+    options = options or {}
+    if file_ext == "csv":
+        with open_upload(file_path, options.get("compression")) as (f, _):
+            return pd.read_csv(f, nrows=n_rows)
+
+    if file_ext in ["ndjson", "jsonl"]:
+        with open_upload(file_path, options.get("compression")) as (f, _):
+            lines = []
+            for line in f:
+                if line.strip():
+                    lines.append(line)
+                if len(lines) >= n_rows:
+                    break
+        return parse_json_lines(lines) if lines else pd.DataFrame()
+
+    columns = options.get("columns")
+    if COLUMNAR_FORMATS[file_ext] == "parquet":
+        batches = pa_parquet.ParquetFile(file_path, memory_map=True).iter_batches(batch_size=n_rows, columns=columns)
+        batch = next(batches, None)
+        return batch.to_pandas() if batch is not None else pd.DataFrame()
+
+    table = pa_feather.read_table(file_path, columns=columns, memory_map=True)
+    # Memory-mapped, so slicing the head only pages in the first rows
+    return table.slice(0, n_rows).to_pandas()
+
+
+def compact_series(col_data):
+    """Return the column in the smallest dtype that holds all of its values exactly"""
+    if len(col_data) == 0 or pd.api.types.is_bool_dtype(col_data):
+        return col_data
+
+    if pd.api.types.is_integer_dtype(col_data):
+        minimum = col_data.min()
+        if pd.isna(minimum):
+            # Only a nullable integer column can have no values at all
+            return col_data.astype("Int8")
+        downcast = "unsigned" if minimum >= 0 else "integer"
+        return pd.to_numeric(col_data, downcast=downcast)
+
+    if pd.api.types.is_float_dtype(col_data):
+        as_float32 = col_data.astype("float32")
+        # Only narrow to float32 when no value loses precision
+        if np.array_equal(as_float32.to_numpy(dtype="float64"), col_data.to_numpy(dtype="float64"), equal_nan=True):
+            return as_float32
+        return col_data
+
+    if col_data.dtype == object or pd.api.types.is_string_dtype(col_data):
+        if col_data.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(col_data):
+            return col_data.astype("category")
+        # Mixed-type object columns keep their values as they are
+        if HAS_PYARROW and pd.api.types.infer_dtype(col_data, skipna=True) == "string":
+            return col_data.astype("string[pyarrow]")
+
+    return col_data
+
+
+def compact_dataframe(df):
+    """Downcast numeric columns and compact text columns to reduce memory usage"""
+    if not df.columns.is_unique:
+        return df
+    compacted = df.copy(deep=False)
+    for col in df.columns:
+        compacted[col] = compact_series(df[col])
+    return compacted
+
+class LoadCancelled(Exception):
+    """Raised inside a background load when the user cancels it"""
+
+
+def finish_load(df, compact):
+    """Optionally compact a loaded frame; return it with its per-column memory report"""
+    if not compact or df.empty:
+        return df, None
+    memory_before = df.memory_usage(deep=True, index=False)
+    original_types = df.dtypes.astype(str)
+    df = compact_dataframe(df)
+    report = pd.DataFrame({
+        "Original Type": original_types,
+        "Memory Before (KB)": memory_before / 1024,
+        "Memory After (KB)": df.memory_usage(deep=True, index=False) / 1024,
+    })
+    return df, report
+
+
+def load_uploaded_file(file_path, file_ext, options, compact, on_progress):
+    """Parse an uploaded file, reusing the ingest cache; runs in a worker thread"""
+    on_progress(0.0, "checking cache")
+    key = cache_key(
+        file_path, {"format": file_ext, **options},
+        on_progress=lambda frac: on_progress(0.0, f"{frac:.0%} of file checked"),
+    )
+    # Share the frame of another session that loaded the same content
+    shared = get_shared_frame(("upload", key, compact))
+    if shared is not None:
+        return shared
+
+    # Reuse the parsed frame if this exact file was loaded before
+    df = load_cached(key)
+
+    if df is None:
+        df = parse_file(
+            file_path, file_ext, options,
+            on_progress=lambda frac: on_progress(frac, f"{frac:.0%} of file parsed"),
+        )
+        on_progress(1.0, "storing in cache")
+        if not df.empty:
+            store_cached(key, df)
+
+    on_progress(1.0, "finishing")
+    return share_frame(("upload", key, compact), *finish_load(df, compact))
+
+
+def load_sample_dataset(name, params, compact, on_progress):
+    """Fetch a sample dataset from the shared registry; runs in a worker thread"""
+    shared_key = ("sample", name, tuple(sorted((params or {}).items())), compact)
+    shared = get_shared_frame(shared_key)
+    if shared is not None:
+        return shared
+
+    on_progress(0.0, "building dataset")
+    df = get_sample_dataset(
+        name, params,
+        on_progress=lambda frac: on_progress(frac, f"{frac:.0%} of columns generated"),
+    )
+    on_progress(1.0, "finishing")
+    return share_frame(shared_key, *finish_load(df, compact))
+
+
 # Table styles
 table_styles = ui.tags.style("""
     table {
@@ -47,16 +640,21 @@ data_loading_layout = ui.layout_sidebar(
             ui.input_file("file",
                 "Upload Data File",
                 multiple=False,
-                accept=[".csv", ".json", ".xlsx", ".xls", ".rds"],
+                accept=[f".{ext}" for ext in [*SUPPORTED_EXTENSIONS, *COMPRESSION_EXTENSIONS]],
                 width="100%",
                 button_label="Browse Files",
                 placeholder="No file selected",
             ),
+            ui.output_ui("file_options_ui"),
+            ui.input_checkbox("compact_load", "Compact data types (lower memory)", False),
             ui.input_action_button("process", "Process Data", class_="btn-primary"),
+            ui.input_action_button("cancel_load", "Cancel Loading", class_="btn-danger"),
             ui.br(),
             ui.br(),
             ui.output_ui("progress"),
             ui.output_text("file_name"),
+            ui.output_text("cache_status"),
+            ui.output_text("session_memory"),
             ui.output_text("error_message", inline=True),
             ui.hr(),
             ui.h4("Sample Datasets"),
@@ -64,17 +662,109 @@ data_loading_layout = ui.layout_sidebar(
             ui.input_action_button("load_iris", "Iris Dataset", class_="btn-secondary"),
             ui.input_action_button("load_boston", "Boston Housing Dataset", class_="btn-secondary"),
             ui.input_action_button("load_wine", "Wine Dataset", class_="btn-secondary"),
+            ui.h5("Synthetic Dataset"),
+            ui.p("Generate a dataset of any size with mixed column types and missing values, e.g. for load testing:"),
+            ui.input_numeric("synthetic_rows", "Rows", 1_000_000, min=1, max=SYNTHETIC_MAX_ROWS, step=100_000),
+            ui.input_numeric("synthetic_cols", "Columns", 20, min=1, max=SYNTHETIC_MAX_COLS),
+            ui.input_numeric("synthetic_missing", "Missing Rate", 0.05, min=0, max=0.95, step=0.01),
+            ui.input_action_button("load_synthetic", "Synthetic Dataset", class_="btn-secondary"),
             width=300
         ),
         ui.card(
             ui.h3("Data Preview"),
             ui.output_text("error_message_main"),
+            ui.output_ui("loading_sample_notice"),
             ui.card(ui.panel_title("Data Preview"), ui.output_table("data_preview")),
             ui.card(ui.panel_title("Data Types"), ui.output_table("data_types")),
         )
     )
 
 def data_loading_server(input, output, session):
+    # Per-column memory usage before and after compaction of the loaded data
+    memory_report = reactive.Value(None)
+
+    # State of the current background load; the progress fields are written by the worker thread
+    active_load = {"description": "", "fraction": 0.0, "detail": "", "cancel": None, "is_upload": False}
+
+    # Parse files and build datasets in a worker thread so other sessions stay responsive
+    @reactive.extended_task
+    async def load_task(loader, *args):
+        return await asyncio.to_thread(loader, *args)
+
+    # Start a background load, abandoning any load that is still running
+    def start_load(description, is_upload, loader, *args):
+        if active_load["cancel"] is not None:
+            active_load["cancel"].set()
+        load_task.cancel()
+
+        cancel_event = threading.Event()
+        active_load.update(description=description, fraction=0.0, detail="", cancel=cancel_event, is_upload=is_upload)
+
+        def on_progress(fraction, detail=""):
+            if cancel_event.is_set():
+                raise LoadCancelled()
+            active_load["fraction"] = fraction
+            active_load["detail"] = detail
+
+        error_store.set("")
+        load_task.invoke(loader, *args, on_progress)
+
+    # Store a newly loaded dataset as both the original and the cleaned data
+    def publish_dataset(df, report=None, state="full"):
+        memory_report.set(report)
+        data_state.set(state)
+        df_raw.set(df)
+        df_cleaned.set(df.copy(deep=False))
+        cleaning_recipe.set([])
+        error_store.set("")
+
+    # Publish the result once the background load finishes
+    @reactive.Effect
+    @reactive.event(load_task.status)
+    def on_load_finished():
+        status = load_task.status()
+        if status == "success":
+            df, report = load_task.value.get()
+            if df.empty:
+                error_store.set("Uploaded data is empty")
+                df_raw.set(None)
+                return
+            publish_dataset(df, report)
+        elif status == "error":
+            error = load_task.error.get()
+            if isinstance(error, LoadCancelled):
+                return
+            error_store.set(f"Error loading {active_load['description']}: {str(error)}")
+            if active_load["is_upload"]:
+                data_state.set(None)
+                df_raw.set(None)
+                df_cleaned.set(None)
+                cleaning_recipe.set([])
+
+    @reactive.Effect
+    @reactive.event(input.cancel_load)
+    def cancel_load():
+        if load_task.status() == "running":
+            active_load["cancel"].set()
+            load_task.cancel()
+            error_store.set(f"Loading {active_load['description']} was cancelled")
+
+    @output
+    @render.ui
+    def progress():
+        if load_task.status() != "running":
+            return None
+        # Poll the worker thread's progress while the load is running
+        reactive.invalidate_later(0.5)
+        fraction = active_load["fraction"]
+        return ui.div(
+            ui.p(f"Loading {active_load['description']}... {active_load['detail']}"),
+            ui.div(
+                ui.div(class_="progress-bar", role="progressbar", style=f"width: {fraction:.0%}"),
+                class_="progress"
+            )
+        )
+
     @output
     @render.text
     def file_name():
@@ -82,7 +772,27 @@ def data_loading_server(input, output, session):
         if file_info:
             return f"Selected file: {file_info[0]['name']}"
         return "No file selected"
-    
+
+    @output
+    @render.text
+    def cache_status():
+        # Refresh after every load attempt
+        df_raw.watch()
+        error_store.watch()
+        return f"Ingest cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses"
+
+    @output
+    @render.text
+    def session_memory():
+        # Refresh when this session's data changes; polling would keep an idle session from spilling
+        df_raw.watch()
+        df_cleaned.watch()
+        mb_held = sum(session_bytes(current_session_id()).values()) / 1024 ** 2
+        totals = memory_totals()
+        return (f"Session memory: {mb_held:.1f} MB of its own "
+                f"(all sessions: {(sum(totals.values()) + shared_bytes()) / 1024 ** 2:.1f} MB in {len(totals)} sessions, "
+                f"{MEMORY_BUDGET_BYTES / 1024 ** 2:.0f} MB budget)")
+
     @output
     @render.text
     def error_message():
@@ -93,142 +803,118 @@ def data_loading_server(input, output, session):
     def error_message_main():
         return error_store.get()
 
+    # Format-specific options: columns to read for columnar files, sheets for Excel files
+    @output
+    @render.ui
+    def file_options_ui():
+        file_info = input.file()
+        if not file_info:
+            return None
+        file_path = file_info[0]["datapath"]
+        file_ext, compression = split_file_name(file_info[0]["name"])
+        if compression is not None:
+            # Listing columns or sheets would mean decompressing the whole file
+            return None
+        try:
+            if file_ext in COLUMNAR_FORMATS and HAS_PYARROW:
+                return ui.input_selectize(
+                    "load_columns", "Columns to Load",
+                    choices=read_columnar_schema(file_path, file_ext),
+                    multiple=True,
+                    options={"placeholder": "All columns"}
+                )
+            if file_ext in ["xlsx", "xls"]:
+                return ui.div(
+                    ui.input_selectize(
+                        "excel_sheets", "Sheets to Load",
+                        choices=read_excel_sheet_names(file_path),
+                        multiple=True,
+                        options={"placeholder": "First sheet"}
+                    ),
+                    ui.input_checkbox("concat_sheets", "Stack sheets with the same columns", True)
+                )
+        except Exception:
+            return None
+        return None
+
     @reactive.Effect
     @reactive.event(input.process)
     def process_uploaded_file():
         file_info = input.file()
         if file_info and len(file_info) > 0:
-            try:
-                file_ext = file_info[0]["name"].split(".")[-1].lower()
-                file_path = file_info[0]["datapath"]
-                
-                with ui.Progress(min=0, max=100) as p:
-                    p.set(10, "Processing file...")
-                    
-                if file_ext == "csv":
-                    df = pd.read_csv(file_path)
-                
-                elif file_ext == "json":
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        json_data = json.load(f)
-
-                    if isinstance(json_data, dict):
-                        normalized_data = []
-                        for key, value in json_data.items():
-                            if isinstance(value, dict):
-                                flattened_dict = {f"{key}.{subkey}": subvalue for subkey, subvalue in value.items()}
-                                normalized_data.append(flattened_dict)
-                            else:
-                                normalized_data.append({key: value})
-                        df = pd.DataFrame(normalized_data)
-
-                    elif isinstance(json_data, list):
-                        df = pd.DataFrame(json_data)
-                    else:
-                        raise ValueError("Unsupported JSON format")
-                
-                elif file_ext in ["xlsx", "xls"]:
-                    # Read Excel file
-                    df = pd.read_excel(file_path)
-                
-                elif file_ext == "rds":
-                    # Read RDS file
-                    if not HAS_PYREADR:
-                        error_store.set("Missing pyreadr library, cannot read RDS files. Please install: pip install pyreadr")
-                        df_raw.set(None)
-                        return
-                    
-                    # Use pyreadr to read RDS file
-                    result = pyreadr.read_r(file_path)
-                    # RDS files usually contain one dataframe, we get the first one
-                    if result:
-                        df = next(iter(result.values()))
-                    else:
-                        raise ValueError("RDS file is empty or format is incorrect")
-
-                else:
-                    error_store.set(f"Unsupported file type: {file_ext}. Supported formats: CSV, JSON, Excel, RDS")
-                    df_raw.set(None)
-                    return
-
-                # Check if data is empty
-                if df.empty:
-                    error_store.set("Uploaded data is empty")
-                    df_raw.set(None)
-                    return
-                
-                # Set original data and cleaned data
-                df_raw.set(df)
-                df_cleaned.set(df.copy())
-                error_store.set("")
-                
-                p.set(100, "Read completed!")
-
-            except Exception as e:
-                error_store.set(f"Error loading file: {str(e)}")
+            file_path = file_info[0]["datapath"]
+            file_ext, compression = upload_format(file_info[0]["name"], file_path)
+
+            format_error = file_format_error(file_ext, compression)
+            if format_error:
+                error_store.set(format_error)
                 df_raw.set(None)
-                df_cleaned.set(None)
+                return
+
+            options = {}
+            if compression is not None:
+                options["compression"] = compression
+            if file_ext in COLUMNAR_FORMATS and "load_columns" in input:
+                options["columns"] = list(input.load_columns())
+            if file_ext in ["xlsx", "xls"] and "excel_sheets" in input:
+                options["sheets"] = list(input.excel_sheets())
+                options["concat_sheets"] = input.concat_sheets()
+
+            # Large files: show a quick sample first while the full file loads in the background
+            sampleable = STREAM_SAMPLEABLE_EXTENSIONS if compression else SAMPLEABLE_EXTENSIONS
+            if file_ext in sampleable and os.path.getsize(file_path) > PREVIEW_THRESHOLD_BYTES:
+                try:
+                    sample, report = finish_load(read_sample(file_path, file_ext, options), input.compact_load())
+                    if not sample.empty:
+                        publish_dataset(sample, report, state="sample")
+                except Exception as e:
+                    print(f"Sampled preview failed, waiting for full load: {str(e)}")
+
+            start_load("file", True, load_uploaded_file, file_path, file_ext, options, input.compact_load())
     
     @reactive.Effect
     @reactive.event(input.load_iris)
     def load_iris_dataset():
-        try:
-            from sklearn.datasets import load_iris
-            data = load_iris()
-            df = pd.DataFrame(data.data, columns=data.feature_names)
-            df['target'] = data.target
-            
-            df_raw.set(df)
-            df_cleaned.set(df.copy())
-            error_store.set("")
-        except Exception as e:
-            error_store.set(f"Error loading Iris dataset: {str(e)}")
+        start_load("Iris dataset", False, load_sample_dataset, "iris", None, input.compact_load())
     
     @reactive.Effect
     @reactive.event(input.load_boston)
     def load_boston_dataset():
-        try:
-            # Since the Boston housing dataset in sklearn has been deprecated, we manually create a simplified version
-            np.random.seed(42)
-            n_samples = 100
-            df = pd.DataFrame({
-                'CRIM': np.random.exponential(0.5, n_samples),
-                'ZN': np.random.choice([0, 20, 40, 60, 80, 100], n_samples),
-                'INDUS': np.random.uniform(0, 20, n_samples),
-                'CHAS': np.random.choice([0, 1], n_samples),
-                'NOX': np.random.uniform(0.4, 0.8, n_samples),
-                'RM': np.random.normal(6, 1, n_samples),
-                'AGE': np.random.uniform(20, 90, n_samples),
-                'DIS': np.random.exponential(3, n_samples),
-                'RAD': np.random.choice([1, 2, 3, 4, 5, 6, 7, 8, 24], n_samples),
-                'TAX': np.random.uniform(200, 700, n_samples),
-                'PTRATIO': np.random.uniform(12, 22, n_samples),
-                'B': np.random.uniform(0, 400, n_samples),
-                'LSTAT': np.random.exponential(7, n_samples),
-                'MEDV': np.random.normal(22, 9, n_samples)
-            })
-            
-            df_raw.set(df)
-            df_cleaned.set(df.copy())
-            error_store.set("")
-        except Exception as e:
-            error_store.set(f"Error loading Boston housing dataset: {str(e)}")
+        start_load("Boston housing dataset", False, load_sample_dataset, "boston", None, input.compact_load())
     
     @reactive.Effect
     @reactive.event(input.load_wine)
     def load_wine_dataset():
-        try:
-            from sklearn.datasets import load_wine
-            data = load_wine()
-            df = pd.DataFrame(data.data, columns=data.feature_names)
-            df['target'] = data.target
-            
-            df_raw.set(df)
-            df_cleaned.set(df.copy())
-            error_store.set("")
-        except Exception as e:
-            error_store.set(f"Error loading wine dataset: {str(e)}")
+        start_load("wine dataset", False, load_sample_dataset, "wine", None, input.compact_load())
+
+    @reactive.Effect
+    @reactive.event(input.load_synthetic)
+    def load_synthetic_dataset():
+        params = {
+            "n_rows": int(input.synthetic_rows() or 0),
+            "n_cols": int(input.synthetic_cols() or 0),
+            "missing_rate": float(input.synthetic_missing() or 0),
+        }
+        if not 1 <= params["n_rows"] <= SYNTHETIC_MAX_ROWS or not 1 <= params["n_cols"] <= SYNTHETIC_MAX_COLS:
+            error_store.set(f"Synthetic dataset must have 1-{SYNTHETIC_MAX_ROWS:,} rows and 1-{SYNTHETIC_MAX_COLS} columns")
+            return
+        if not 0 <= params["missing_rate"] < 1:
+            error_store.set("Missing rate must be between 0 and 1")
+            return
+        start_load(f"synthetic dataset ({params['n_rows']:,} x {params['n_cols']})", False, load_sample_dataset, "synthetic", params, input.compact_load())
     
+    @output
+    @render.ui
+    def loading_sample_notice():
+        df = df_raw.get()
+        if data_state.get() == "sample" and df is not None:
+            if load_task.status() == "running":
+                message = f"Showing a sample of the first {len(df):,} rows while the full file loads in the background."
+            else:
+                message = f"Only a sample of the first {len(df):,} rows is loaded. Process the file again to load it in full."
+            return ui.div(message, class_="alert alert-warning")
+        return None
+
     @output
     @render.table
     def data_preview():
@@ -255,7 +941,13 @@ def data_loading_server(input, output, session):
     def data_types():
         df = df_raw.get()
         if df is not None:
-            return pd.DataFrame(df.dtypes, columns=["Data Type"]).reset_index().rename(columns={"index": "Column Name"})
+            types = pd.DataFrame(df.dtypes, columns=["Data Type"])
+            report = memory_report.get()
+            if report is not None:
+                # Show the memory saved by compaction next to each column
+                types = types.join(report)
+                types.loc["Total"] = ["", "", report["Memory Before (KB)"].sum(), report["Memory After (KB)"].sum()]
+            return types.reset_index().rename(columns={"index": "Column Name"})
         return pd.DataFrame() 
 
 data_loading_ui = ui.nav_panel(
@@ -1,22 +1,604 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import weakref
 from shiny import reactive
+from shiny.session import get_current_session
+import numpy as np
+import pandas as pd
+from ingest_cache import write_frame, read_frame
 
-# A/B testing variant 
-user_ab_variant = reactive.Value(None)
+# Memory budget for DataFrames held by all sessions; least recently used sessions spill to disk beyond it
+MEMORY_BUDGET_BYTES = int(os.environ.get("DATA_STORE_BUDGET_MB", "4096")) * 1024 * 1024
+# Sessions idle for longer than this spill their DataFrames to disk
+IDLE_SPILL_SECONDS = int(os.environ.get("DATA_STORE_IDLE_MINUTES", "30")) * 60
+SPILL_DIR = os.environ.get("DATA_STORE_SPILL_DIR", os.path.join(tempfile.gettempdir(), "data_store_spill"))
+# Number of changes that can be undone for values that keep a history
+HISTORY_STEPS = int(os.environ.get("DATA_STORE_HISTORY_STEPS", "20"))
+
+# Copy-on-write lets each version of a frame share its unchanged columns
+# with the previous one (always on from pandas 3)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# Every session-scoped value, so memory can be totalled and freed per session
+_session_values = []
+
+# Last time each session read or wrote the store
+_last_used = {}
+
+# Loaded frames shared read-only by every session that loads the same content,
+# kept only while some session still holds them
+_shared_frames = weakref.WeakValueDictionary()
+# Memory report, size in bytes and the bytes of each column (by fingerprint) of each shared frame
+_shared_info = {}
+_shared_lock = threading.Lock()
+
+# Held while a session's stored value is read or replaced, so a spill
+# running in a worker thread never removes a value that is in use
+_spill_lock = threading.RLock()
+# The running background budget check, whether another is needed once it
+# finishes, and the sessions that check must keep in memory
+_budget = {"task": None, "again": False, "keep": set()}
+
+
+class SessionValue:
+    """A reactive value that holds a separate value for each browser session.
+
+    Reads and writes go to the value of the session that is currently
+    running, so one user's data never invalidates another user's outputs.
+    DataFrames may be spilled to disk and are reloaded on the next read.
+
+    With history=True, every set() given a label is recorded so it can be
+    undone and redone; a set() without a label starts a new history.
+
+    Each update records which DataFrame columns changed. Outputs that read
+    through column() or get_columns() are only invalidated when one of
+    their columns changes, rather than on every update.
+    """
+
+    def __init__(self, default=None, name=None, history=False):
+        self.default = default
+        self.name = name
+        self.history_steps = HISTORY_STEPS if history else 0
+        # Per session: a reactive version counter, the stored value, its size
+        # in memory, the sizes of its DataFrame columns (see frame_sizes) and
+        # the (path, bytes) of its spill file, and the shared columns kept in
+        # memory while it is spilled with their positions in the frame
+        self._versions = {}
+        self._data = {}
+        self._bytes = {}
+        self._sizes = {}
+        self._spilled = {}
+        self._kept = {}
+        # Per session: (label, value) pairs that can be undone and redone
+        self._undo = {}
+        self._redo = {}
+        # Per session: the last update's (version, changed columns) and a
+        # reactive counter for each column that an output depends on
+        self._changes = {}
+        self._column_versions = {}
+        # Per session: get/set counts and how many reactive consumers updates invalidated
+        self._counts = {}
+        _session_values.append(self)
+
+    def _version(self, active=True):
+        session = get_current_session()
+        # Outside a session (e.g. scripts and tests) all callers share one value
+        session_id = session.id if session is not None else None
+        if session_id not in self._versions:
+            self._versions[session_id] = reactive.Value(0)
+        # Only reads and writes made for the user count as activity, so a
+        # session whose outputs merely refresh can still go idle
+        if active:
+            _last_used[session_id] = time.monotonic()
+        else:
+            _last_used.setdefault(session_id, time.monotonic())
+        return session_id, self._versions[session_id]
+
+    def _count(self, session_id, key, n=1):
+        counts = self._counts.setdefault(session_id, {"gets": 0, "sets": 0, "invalidations": 0, "last_fanout": 0})
+        counts[key] += n
+
+    def get(self):
+        session_id, version = self._version()
+        self._count(session_id, "gets")
+        version.get()
+        return self._current(session_id)
+
+    def __call__(self):
+        return self.get()
+
+    def watch(self):
+        """Depend on changes to the stored value without reading it.
+
+        For status outputs: a spilled value stays on disk and the session
+        is not marked as active.
+        """
+        _, version = self._version(active=False)
+        version.get()
+
+    def _current(self, session_id):
+        with _spill_lock:
+            if session_id in self._spilled:
+                self._restore(session_id)
+            return self._data.get(session_id, self.default)
+
+    def _depend_on_columns(self, session_id, columns):
+        counters = self._column_versions.setdefault(session_id, {})
+        for col in columns:
+            if col not in counters:
+                counters[col] = reactive.Value(0)
+            counters[col].get()
+
+    def column(self, name):
+        """Return one column of the stored DataFrame, or None if it has no such column.
+
+        The caller is only invalidated when this column changes.
+        """
+        session_id, _ = self._version()
+        self._count(session_id, "gets")
+        self._depend_on_columns(session_id, [name])
+        data = self._current(session_id)
+        if data is None or name not in data.columns:
+            return None
+        return data[name]
+
+    def get_columns(self, names):
+        """Return the stored DataFrame restricted to the given columns that exist, or None without data.
+
+        The caller is only invalidated when one of these columns changes.
+        """
+        session_id, _ = self._version()
+        self._count(session_id, "gets")
+        self._depend_on_columns(session_id, names)
+        data = self._current(session_id)
+        if data is None:
+            return None
+        # Repeated names would select a column more than once
+        return data[[col for col in dict.fromkeys(names) if col in data.columns]]
+
+    def column_key(self, name):
+        """Hashable key that changes whenever the named column does, for caching results computed from it.
+
+        The caller is invalidated when the column changes.
+        """
+        session_id, _ = self._version()
+        self._depend_on_columns(session_id, [name])
+        return (session_id, self.name, name, self._column_versions[session_id][name].get())
+
+    def last_change(self):
+        """Version number of the stored value and the set of columns its last update changed (None for all)"""
+        session_id, version = self._version()
+        return version.get(), self._changes.get(session_id, (0, None))[1]
+
+    def set(self, value, label=None):
+        session_id, version = self._version()
+        with _spill_lock:
+            if session_id not in self._spilled and self._data.get(session_id, self.default) is value:
+                return False
+            if label is not None and self.history_steps and session_id not in self._spilled:
+                undo = self._undo.setdefault(session_id, [])
+                undo.append((label, self._data.get(session_id, self.default)))
+                del undo[:-self.history_steps]
+            else:
+                self._undo.pop(session_id, None)
+            self._redo.pop(session_id, None)
+            self._replace(session_id, version, value)
+        return True
+
+    def undo(self):
+        """Revert the last recorded change; return its label, or None if there is nothing to undo"""
+        return self._step(self._undo, self._redo)
+
+    def redo(self):
+        """Reapply the last undone change; return its label, or None if there is nothing to redo"""
+        return self._step(self._redo, self._undo)
+
+    def history(self):
+        """Labels of the changes that can be undone and redone, most recent last"""
+        session_id, version = self._version()
+        version.get()
+        return ([label for label, _ in self._undo.get(session_id, [])],
+                [label for label, _ in self._redo.get(session_id, [])])
+
+    def _step(self, source, target):
+        session_id, version = self._version()
+        with _spill_lock:
+            if not source.get(session_id):
+                return None
+            label, value = source[session_id].pop()
+            # Versions share unchanged columns, so keeping both sides costs only the changed ones
+            target.setdefault(session_id, []).append((label, self._data.get(session_id, self.default)))
+            self._replace(session_id, version, value)
+        return label
+
+    def _replace(self, session_id, version, value):
+        old = None if session_id in self._spilled else self._data.get(session_id, self.default)
+        changed = changed_columns(old, value)
+        self._discard_spill(session_id)
+        self._data[session_id] = value
+        self._measure(session_id, value)
+        fanout = dependent_count(version)
+        with reactive.isolate():
+            version.set(version.get() + 1)
+            self._changes[session_id] = (version.get(), changed)
+            for col, counter in self._column_versions.get(session_id, {}).items():
+                if changed is None or col in changed:
+                    fanout += dependent_count(counter)
+                    counter.set(counter.get() + 1)
+        self._count(session_id, "sets")
+        self._count(session_id, "invalidations", fanout)
+        self._counts[session_id]["last_fanout"] = fanout
+        schedule_memory_budget(keep=session_id)
+
+    def _measure(self, session_id, value):
+        # Columns kept from the previous version or a shared frame are not measured again
+        if isinstance(value, pd.DataFrame):
+            known = dict(self._sizes.get(session_id, (0, []))[1])
+            known.update(shared_column_bytes())
+            self._sizes[session_id] = frame_sizes(value, known)
+        else:
+            self._sizes.pop(session_id, None)
+        # Shared frames are counted once in shared_bytes(), not per session
+        self._bytes[session_id] = 0 if is_shared_frame(value) else private_bytes(value, self._sizes.get(session_id))
+
+    def spill(self, session_id):
+        """Move a session's DataFrame to a file on disk; return the bytes freed.
+
+        Only the columns the session does not share with a shared frame are
+        written; shared columns stay in memory for the other sessions anyway
+        and are put back in place on restore.
+
+        Safe to call from a worker thread: the file is written without
+        holding the store, and discarded if the session changed its value
+        in the meantime.
+        """
+        value = self._data.get(session_id)
+        if not isinstance(value, pd.DataFrame) or session_id in self._spilled or is_shared_frame(value):
+            return 0
+        shared = shared_column_bytes()
+        private = [i for i in range(value.shape[1]) if column_fingerprint(value.iloc[:, i]) not in shared]
+        if not private:
+            # Nothing but the index would be freed
+            return 0
+        kept = sorted(set(range(value.shape[1])) - set(private))
+        os.makedirs(SPILL_DIR, exist_ok=True)
+        path = write_frame(os.path.join(SPILL_DIR, f"{session_id}-{self.name}"), value.iloc[:, private])
+        with _spill_lock:
+            if self._data.get(session_id) is not value or session_id in self._spilled:
+                remove_file(path)
+                return 0
+            freed = self._bytes.pop(session_id, 0)
+            # The memory of spilled columns may be reused, so their fingerprints no longer identify them
+            self._sizes.pop(session_id, None)
+            self._spilled[session_id] = (path, freed)
+            if kept:
+                # Selecting columns keeps the shared column memory rather than copying it
+                self._kept[session_id] = (value.iloc[:, kept], private + kept)
+            # Earlier versions are not spilled, so they can no longer be restored
+            self._undo.pop(session_id, None)
+            self._redo.pop(session_id, None)
+            del self._data[session_id]
+        return freed
+
+    def _restore(self, session_id):
+        path, _ = self._spilled[session_id]
+        data = read_frame(path)
+        if session_id in self._kept:
+            kept, positions = self._kept[session_id]
+            # Put the shared columns back in their original positions
+            data = pd.concat([data.set_axis(kept.index), kept], axis=1).iloc[:, np.argsort(positions)]
+        self._data[session_id] = data
+        self._measure(session_id, self._data[session_id])
+        self._discard_spill(session_id)
+        schedule_memory_budget(keep=session_id)
+
+    def _discard_spill(self, session_id):
+        path, _ = self._spilled.pop(session_id, (None, 0))
+        self._kept.pop(session_id, None)
+        if path is not None:
+            remove_file(path)
+
+    def drop_session(self, session_id):
+        with _spill_lock:
+            self._discard_spill(session_id)
+            self._versions.pop(session_id, None)
+            self._data.pop(session_id, None)
+            self._bytes.pop(session_id, None)
+            self._sizes.pop(session_id, None)
+            self._undo.pop(session_id, None)
+            self._redo.pop(session_id, None)
+            self._changes.pop(session_id, None)
+            self._column_versions.pop(session_id, None)
+            self._counts.pop(session_id, None)
+
+    def stats(self):
+        """Memory and reactivity statistics of this value for each session"""
+        rows = []
+        for session_id in self._versions:
+            counts = self._counts.get(session_id, {})
+            dependents = dependent_count(self._versions[session_id])
+            dependents += sum(dependent_count(counter) for counter in self._column_versions.get(session_id, {}).values())
+            rows.append({
+                "session": session_id,
+                "value": self.name,
+                "bytes": self._bytes.get(session_id, 0),
+                "spilled_bytes": self._spilled.get(session_id, (None, 0))[1],
+                "gets": counts.get("gets", 0),
+                "sets": counts.get("sets", 0),
+                "invalidations": counts.get("invalidations", 0),
+                "last_fanout": counts.get("last_fanout", 0),
+                "dependents": dependents,
+                "undo_steps": len(self._undo.get(session_id, [])),
+            })
+        return rows
+
+
+def get_shared_frame(key):
+    """Return the shared (frame, report) for a content key, or None if no session holds it"""
+    with _shared_lock:
+        df = _shared_frames.get(key)
+        return None if df is None else (df, _shared_info[key][0])
+
+
+def share_frame(key, df, report=None):
+    """Register a loaded frame under its content key; return the (frame, report) every session should use.
+
+    If another session registered the same content first, its frame is
+    returned instead, so identical data is held in memory only once.
+    Sessions must treat the frame as read-only; with copy-on-write, a
+    session's changes only copy the columns it modifies.
+    """
+    with _shared_lock:
+        shared = _shared_frames.get(key)
+        if shared is not None:
+            return shared, _shared_info[key][0]
+        _shared_frames[key] = df
+        index_bytes, sizes = frame_sizes(df)
+        column_bytes = {fingerprint: size for fingerprint, size in sizes if fingerprint is not None}
+        _shared_info[key] = (report, index_bytes + sum(size for _, size in sizes), column_bytes)
+        weakref.finalize(df, _shared_info.pop, key, None)
+        return df, report
+
+
+def shared_column_bytes():
+    """Bytes of every column of the shared frames, by column fingerprint"""
+    with _shared_lock:
+        return {fingerprint: size for info in _shared_info.values() for fingerprint, size in info[2].items()}
+
+
+def frame_sizes(df, known=None):
+    """Bytes of a DataFrame's index and the (fingerprint, bytes) of each of its columns.
+
+    Columns whose fingerprint is in known (fingerprint to bytes) are not
+    measured again, so after an update only the changed columns are.
+    """
+    known = known or {}
+    sizes = []
+    for i in range(df.shape[1]):
+        series = df.iloc[:, i]
+        fingerprint = column_fingerprint(series)
+        size = known.get(fingerprint) if fingerprint is not None else None
+        if size is None:
+            size = int(series.memory_usage(index=False, deep=True))
+        sizes.append((fingerprint, size))
+    return int(df.index.memory_usage(deep=True)), sizes
+
+
+def private_bytes(value, sizes=None):
+    """Memory held by a stored value, leaving out columns it shares with a shared frame.
+
+    sizes is the frame's frame_sizes(), if already known.
+    """
+    if not isinstance(value, pd.DataFrame):
+        return value_bytes(value)
+    index_bytes, columns = sizes or frame_sizes(value, shared_column_bytes())
+    shared = shared_column_bytes()
+    return index_bytes + sum(size for fingerprint, size in columns if fingerprint is None or fingerprint not in shared)
+
+
+def is_shared_frame(df):
+    with _shared_lock:
+        return any(shared is df for shared in _shared_frames.values())
+
+
+def shared_frame_count():
+    return len(_shared_frames)
+
+
+def shared_bytes():
+    """Bytes held by shared frames, counted once rather than per session"""
+    with _shared_lock:
+        return sum(_shared_info[key][1] for key in _shared_frames.keys() if key in _shared_info)
+
+
+def dependent_count(value):
+    """Number of reactive consumers currently depending on a reactive.Value"""
+    # Relies on shiny internals, so report 0 rather than fail if they change
+    dependents = getattr(getattr(value, "_value_dependents", None), "_dependents", None)
+    return len(dependents) if dependents is not None else 0
+
+
+def column_fingerprint(series):
+    """Identify the memory holding a column's values, or None if it cannot be determined"""
+    values = series.array
+    buffers = []
+    for attr in ("_ndarray", "_data", "_mask", "_codes", "_sparse_values"):
+        array = getattr(values, attr, None)
+        if isinstance(array, np.ndarray):
+            buffers.append((array.__array_interface__["data"][0], array.shape, array.strides))
+    chunked = getattr(values, "_pa_array", None)
+    if chunked is not None:
+        buffers.extend(buf.address for chunk in chunked.chunks for buf in chunk.buffers() if buf is not None)
+    return tuple(buffers) or None
+
+
+def changed_columns(old, new):
+    """Names of the columns that differ between two versions of a DataFrame, or None if all may differ.
+
+    With copy-on-write, a column whose values still live in the same memory
+    is unchanged, so this never has to compare the values themselves.
+    """
+    if not isinstance(old, pd.DataFrame) or not isinstance(new, pd.DataFrame):
+        return None
+    if old.columns.has_duplicates or new.columns.has_duplicates:
+        return None
+    if not (old.index is new.index or old.index.equals(new.index)):
+        # Rows were added, removed or reordered
+        return None
+    changed = set(old.columns).symmetric_difference(new.columns)
+    for col in new.columns.intersection(old.columns):
+        old_col, new_col = old[col], new[col]
+        fingerprint = column_fingerprint(new_col)
+        if fingerprint is None or old_col.dtype != new_col.dtype or column_fingerprint(old_col) != fingerprint:
+            changed.add(col)
+    return changed
+
+
+def value_bytes(value):
+    """Estimate the memory held by a stored value"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    return 0
+
+
+def session_bytes(session_id):
+    """Bytes held in memory by one session, per stored value"""
+    return {store.name: store._bytes.get(session_id, 0) for store in _session_values}
+
+
+def spilled_bytes(session_id):
+    """Bytes one session has spilled to disk"""
+    return sum(store._spilled.get(session_id, (None, 0))[1] for store in _session_values)
+
+
+def memory_totals():
+    """Bytes held in memory by each active session, largest first"""
+    # Copies of the dicts, as sessions may change them while a worker thread enforces the budget
+    totals = {session_id: 0 for session_id in list(_last_used)}
+    for store in _session_values:
+        for session_id, size in list(store._bytes.items()):
+            totals[session_id] = totals.get(session_id, 0) + size
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def store_stats():
+    """Memory and reactivity statistics of every stored value in every session"""
+    return [row for store in _session_values for row in store.stats()]
+
+
+def spill_session(session_id):
+    """Spill all of a session's DataFrames to disk; return the bytes freed"""
+    freed = 0
+    for store in _session_values:
+        try:
+            freed += store.spill(session_id)
+        except Exception as e:
+            # Keep the frame in memory if it cannot be written
+            print(f"Data store: could not spill {store.name} of session {session_id}: {str(e)}")
+    return freed
+
+
+def enforce_memory_budget(keep=()):
+    """Spill idle sessions, then least recently used sessions until memory use fits the budget.
+
+    Sessions in keep are never spilled. Writing spill files can take long,
+    so the app calls this through schedule_memory_budget().
+    """
+    now = time.monotonic()
+    totals = memory_totals()
+    total_bytes = sum(totals.values()) + shared_bytes()
+    for session_id in sorted(totals, key=lambda sid: _last_used.get(sid, 0)):
+        if session_id in keep or totals[session_id] == 0:
+            continue
+        idle = now - _last_used.get(session_id, 0) > IDLE_SPILL_SECONDS
+        if not idle and total_bytes <= MEMORY_BUDGET_BYTES:
+            break
+        total_bytes -= spill_session(session_id)
+    return total_bytes
+
+
+def schedule_memory_budget(keep=None):
+    """Enforce the memory budget in a worker thread, so spilling never blocks the event loop.
+
+    Requests made while a check is running start one more check after it.
+    Outside a running event loop (scripts and tests) the check runs directly.
+    """
+    if keep is not None:
+        _budget["keep"].add(keep)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        keep = set(_budget["keep"])
+        _budget["keep"].clear()
+        enforce_memory_budget(keep)
+        return
+    if _budget["task"] is not None and not _budget["task"].done():
+        _budget["again"] = True
+        return
+    _budget["task"] = loop.create_task(run_memory_budget())
+
+
+async def run_memory_budget():
+    while True:
+        _budget["again"] = False
+        keep = set(_budget["keep"])
+        _budget["keep"].clear()
+        try:
+            await asyncio.to_thread(enforce_memory_budget, keep)
+        except Exception as e:
+            print(f"Data store: could not enforce the memory budget: {str(e)}")
+        if not _budget["again"]:
+            break
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def current_session_id():
+    session = get_current_session()
+    return session.id if session is not None else None
+
+
+def end_session(session_id):
+    """Release everything a session stored, called when the session closes"""
+    for store in _session_values:
+        store.drop_session(session_id)
+    _last_used.pop(session_id, None)
+
+
+# A/B testing variant
+user_ab_variant = SessionValue(None, "user_ab_variant")
 
 # Raw data
-df_raw = reactive.Value(None)
+df_raw = SessionValue(None, "df_raw")
+
+# Whether the loaded data is a quick "sample" of a large file or the "full" dataset
+data_state = SessionValue(None, "data_state")
 
 # Cleaned data
-df_cleaned = reactive.Value(None)
+df_cleaned = SessionValue(None, "df_cleaned", history=True)
+
+# Cleaning steps applied since the data was loaded, recorded for replay (see cleaning_steps.py)
+cleaning_recipe = SessionValue([], "cleaning_recipe", history=True)
 
 # Data after feature engineering
-df_engineered = reactive.Value(None)
+df_engineered = SessionValue(None, "df_engineered", history=True)
 
 # Error messages
-error_store = reactive.Value("")
+error_store = SessionValue("", "error_store")
 
 # Currently selected model
-selected_model = reactive.Value(None)
+selected_model = SessionValue(None, "selected_model")
 
 # Model evaluation results
-model_results = reactive.Value(None) 
+model_results = SessionValue(None, "model_results")
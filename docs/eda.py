@@ -4,7 +4,8 @@ import numpy as np
 import plotly.express as px
 import plotly.figure_factory as ff
 import plotly.graph_objects as go
-from data_store import df_cleaned, error_store, user_ab_variant
+from data_store import df_cleaned, data_state, error_store, user_ab_variant
+from column_profile import column_profile, column_histogram
 from shinywidgets import output_widget, render_widget
 
 # Exploratory Data Analysis UI
@@ -62,6 +63,7 @@ eda_layout = ui.layout_sidebar(
             ),
             width=300
         ),
+        ui.output_ui("eda_sample_notice"),
         ui.navset_tab(  # Use tab navigation instead of the original layout
             ui.nav_panel(
                 "Data Summary",
@@ -97,8 +99,19 @@ eda_layout = ui.layout_sidebar(
         )
     )
 
+def requested_columns(columns):
+    """Column names without blanks or repeats, so data[col] is always a single column.
+
+    The filter column is often also the analysed column.
+    """
+    return list(dict.fromkeys(col for col in columns if col))
+
+
 def eda_server(input, output, session):
-    # Update column selection dropdown
+    # Column names last offered, so choices are only sent when they change
+    offered_columns = {"all": None, "numeric": None}
+
+    # Update column selection dropdowns whenever the cleaned data's columns change
     @reactive.effect
     def update_column_choices():
         data = df_cleaned.get()
@@ -109,25 +122,47 @@ def eda_server(input, output, session):
             # Get numeric columns
             numeric_columns = data.select_dtypes(include=['number']).columns.tolist()
             
-            # Get categorical columns
-            categorical_columns = data.select_dtypes(exclude=['number']).columns.tolist()
+            if offered_columns == {"all": all_columns, "numeric": numeric_columns}:
+                return
+            offered_columns.update(all=all_columns, numeric=numeric_columns)
+            
+            # Keep the user's selections that still exist
+            with reactive.isolate():
+                current = {name: input[name]() if name in input else None
+                           for name in ["filter_col", "univariate_col", "x_col", "y_col", "color_col", "size_col"]}
+                features = input.correlation_features() if "correlation_features" in input else None
+                current_features = [col for col in (features or []) if col in numeric_columns]
+            
+            def keep(name, default):
+                return current[name] if current[name] in all_columns else default
             
             # Update dropdown selection box
-            ui.update_select("filter_col", choices=all_columns, selected=all_columns[0] if all_columns else None)
-            ui.update_select("univariate_col", choices=all_columns, selected=all_columns[0] if all_columns else None)
-            ui.update_select("x_col", choices=all_columns, selected=numeric_columns[0] if numeric_columns else all_columns[0] if all_columns else None)
-            ui.update_select("y_col", choices=all_columns, selected=numeric_columns[1] if len(numeric_columns) > 1 else numeric_columns[0] if numeric_columns else all_columns[0] if all_columns else None)
+            ui.update_select("filter_col", choices=all_columns, selected=keep("filter_col", all_columns[0] if all_columns else None))
+            ui.update_select("univariate_col", choices=all_columns, selected=keep("univariate_col", all_columns[0] if all_columns else None))
+            ui.update_select("x_col", choices=all_columns, selected=keep("x_col", numeric_columns[0] if numeric_columns else all_columns[0] if all_columns else None))
+            ui.update_select("y_col", choices=all_columns, selected=keep("y_col", numeric_columns[1] if len(numeric_columns) > 1 else numeric_columns[0] if numeric_columns else all_columns[0] if all_columns else None))
             
             # Color and size variables can be empty
             color_choices = [None] + all_columns
-            ui.update_select("color_col", choices=color_choices, selected=None)
-            ui.update_select("size_col", choices=color_choices, selected=None)
+            ui.update_select("color_col", choices=color_choices, selected=keep("color_col", None))
+            ui.update_select("size_col", choices=color_choices, selected=keep("size_col", None))
             
             # Update feature selection for correlation analysis
-            ui.update_checkbox_group("correlation_features", choices=numeric_columns, selected=numeric_columns[:min(5, len(numeric_columns))])
+            ui.update_checkbox_group("correlation_features", choices=numeric_columns, selected=current_features or numeric_columns[:min(5, len(numeric_columns))])
             
             print(f"EDA: Updated column choices with {len(all_columns)} columns")
 
+    @output
+    @render.ui
+    def eda_sample_notice():
+        data = df_cleaned.get()
+        if data_state.get() == "sample" and data is not None:
+            return ui.div(
+                f"Exploring a sample of {len(data):,} rows; results will update when the full dataset finishes loading.",
+                class_="alert alert-warning"
+            )
+        return None
+
     # Dynamically generate filter value UI
     @output
     @render.ui
@@ -185,7 +220,28 @@ def eda_server(input, output, session):
     # Get filtered data
     @reactive.calc
     def get_filtered_data():
-        data = df_cleaned.get()
+        return apply_filter(df_cleaned.get())
+
+    # Get the filtered rows of only some columns; callers are not invalidated
+    # when other columns change
+    def get_filtered_columns(columns):
+        columns = requested_columns(columns)
+        data = apply_filter(df_cleaned.get_columns(requested_columns([*columns, input.filter_col()])))
+        return data[[col for col in columns if col in data.columns]]
+
+    def filtered_column_key(col, data):
+        """Cache key of a column of the filtered data; shared with the Data Cleaning tab unless the filter removed rows"""
+        key = df_cleaned.column_key(col)
+        if len(data) != len(df_cleaned.column(col)):
+            key = (key, filter_key())
+        return key
+
+    def filter_key():
+        """Identify the rows apply_filter keeps, for caching statistics of filtered data"""
+        settings = tuple(tuple(input[name]() or ()) for name in ("filter_range", "filter_values") if name in input)
+        return (df_cleaned.column_key(input.filter_col()), settings)
+
+    def apply_filter(data):
         if data is None:
             return pd.DataFrame()
         
@@ -242,8 +298,8 @@ def eda_server(input, output, session):
     # Univariate analysis charts
     @render_widget
     def univariate_plot():
-        data = get_filtered_data()
         col = input.univariate_col()
+        data = get_filtered_columns([col])
         plot_type = input.univariate_plot_type()
         
         if data.empty or col not in data.columns:
@@ -253,12 +309,15 @@ def eda_server(input, output, session):
         # Create different charts based on data type and chart type
         if pd.api.types.is_numeric_dtype(data[col]):
             if plot_type == "Histogram":
-                fig = px.histogram(
-                    data, 
-                    x=col,
-                    nbins=input.bins(),
+                # Binned here and cached per number of bins, so only the bars are sent
+                edges, counts = column_histogram(filtered_column_key(col, data), data[col], input.bins())
+                fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges), name=col))
+                fig.update_layout(
                     title=f"{col} Histogram",
-                    template="plotly_white"
+                    template="plotly_white",
+                    xaxis_title=col,
+                    yaxis_title="count",
+                    bargap=0
                 )
             
             elif plot_type == "Box Plot":
@@ -310,32 +369,33 @@ def eda_server(input, output, session):
     @output
     @render.ui
     def univariate_stats():
-        data = get_filtered_data()
         col = input.univariate_col()
+        data = get_filtered_columns([col])
         
         if data.empty or col not in data.columns:
             return ui.p("No data available or column")
         
+        profile = column_profile(filtered_column_key(col, data), data[col])
+        
         stats = []
         stats.append(ui.h4(f"Column: {col}"))
-        stats.append(ui.p(f"Data Type: {data[col].dtype}"))
-        stats.append(ui.p(f"Non-null Value Count: {data[col].count()} / {len(data[col])}"))
-        stats.append(ui.p(f"Missing Value Count: {data[col].isna().sum()} ({data[col].isna().mean():.2%})"))
+        stats.append(ui.p(f"Data Type: {profile['dtype']}"))
+        stats.append(ui.p(f"Non-null Value Count: {profile['count']} / {profile['rows']}"))
+        stats.append(ui.p(f"Missing Value Count: {profile['missing']} ({profile['missing_rate']:.2%})"))
         
-        if pd.api.types.is_numeric_dtype(data[col]):
-            stats.append(ui.p(f"Minimum: {data[col].min():.4g}"))
-            stats.append(ui.p(f"Maximum: {data[col].max():.4g}"))
-            stats.append(ui.p(f"Mean: {data[col].mean():.4g}"))
-            stats.append(ui.p(f"Median: {data[col].median():.4g}"))
-            stats.append(ui.p(f"Standard Deviation: {data[col].std():.4g}"))
-            stats.append(ui.p(f"Skewness: {data[col].skew():.4g}"))
-            stats.append(ui.p(f"Kurtosis: {data[col].kurtosis():.4g}"))
+        if profile["numeric"]:
+            stats.append(ui.p(f"Minimum: {profile['min']:.4g}"))
+            stats.append(ui.p(f"Maximum: {profile['max']:.4g}"))
+            stats.append(ui.p(f"Mean: {profile['mean']:.4g}"))
+            stats.append(ui.p(f"Median: {profile['median']:.4g}"))
+            stats.append(ui.p(f"Standard Deviation: {profile['std']:.4g}"))
+            stats.append(ui.p(f"Skewness: {profile['skew']:.4g}"))
+            stats.append(ui.p(f"Kurtosis: {profile['kurtosis']:.4g}"))
         else:
-            stats.append(ui.p(f"Unique Value Count: {data[col].nunique()}"))
-            value_counts = data[col].value_counts().head(5)
+            stats.append(ui.p(f"Unique Value Count: {profile['nunique']}"))
             stats.append(ui.p("Top 5 Value Frequencies:"))
-            for val, count in value_counts.items():
-                stats.append(ui.p(f"- {val}: {count} ({count/len(data[col]):.2%})"))
+            for val, count in profile["top_values"][:5]:
+                stats.append(ui.p(f"- {val}: {count} ({count/profile['rows']:.2%})"))
         
         return ui.div(*stats)
     
@@ -545,8 +605,8 @@ def eda_server(input, output, session):
     # Correlation analysis chart
     @render_widget
     def correlation_plot():
-        data = get_filtered_data()
         features = input.correlation_features()
+        data = get_filtered_columns(list(features or []))
         method = input.correlation_method().lower()
 
         # ** Data Check: If data is empty or features are not selected**
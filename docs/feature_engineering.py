@@ -65,6 +65,11 @@ feature_engineering_layout = ui.layout_sidebar(
                 ui.hr(),
                 ui.input_action_button("restore_original", "Restore Original Data", class_="btn-warning"),
                 ui.input_action_button("use_engineered", "Use Engineered Features", class_="btn-success"),
+                ui.br(),
+                ui.br(),
+                ui.input_action_button("undo_engineering", "Undo", class_="btn-secondary"),
+                ui.input_action_button("redo_engineering", "Redo", class_="btn-secondary"),
+                ui.output_text("engineering_history"),
                 style="height: calc(100vh - 100px); overflow-y: auto; padding-right: 10px;"  # Set height and scrollbar
             ),
             width=350
@@ -107,10 +112,10 @@ def feature_engineering_server(input, output, session):
             # Only keep numeric columns for feature engineering
             numeric_data = cleaned_data.select_dtypes(include=['number'])
             if not numeric_data.empty:
-                df_engineered.set(numeric_data.copy())
+                df_engineered.set(numeric_data.copy(deep=False))
             else:
                 # If no numeric columns, use original data
-                df_engineered.set(cleaned_data.copy())
+                df_engineered.set(cleaned_data.copy(deep=False))
     
     # React to changes in cleaned data
     @reactive.effect
@@ -121,10 +126,10 @@ def feature_engineering_server(input, output, session):
             # Only keep numeric columns for feature engineering
             numeric_data = cleaned_data.select_dtypes(include=['number'])
             if not numeric_data.empty:
-                df_engineered.set(numeric_data.copy())
+                df_engineered.set(numeric_data.copy(deep=False))
             else:
                 # If no numeric columns, use original data
-                df_engineered.set(cleaned_data.copy())
+                df_engineered.set(cleaned_data.copy(deep=False))
             # Clear any error messages
             error_store.set("")
     
@@ -272,7 +277,7 @@ def feature_engineering_server(input, output, session):
         
         try:
             # Create new data frame
-            new_data = data.copy()
+            new_data = data.copy(deep=False)
             
             # Create ratio feature
             ratio_name = f"{feature1}_div_{feature2}"
@@ -281,7 +286,7 @@ def feature_engineering_server(input, output, session):
             new_data[ratio_name] = new_data[feature1] / new_data[feature2].replace(0, np.nan)
             
             # Update data
-            df_engineered.set(new_data)
+            df_engineered.set(new_data, label=f"Create {ratio_name}")
             error_store.set("")
         except Exception as e:
             error_store.set(f"Error creating ratio feature: {str(e)}")
@@ -304,14 +309,14 @@ def feature_engineering_server(input, output, session):
         
         try:
             # Create new data frame
-            new_data = data.copy()
+            new_data = data.copy(deep=False)
             
             # Create difference feature
             diff_name = f"{feature1}_minus_{feature2}"
             new_data[diff_name] = new_data[feature1] - new_data[feature2]
             
             # Update data
-            df_engineered.set(new_data)
+            df_engineered.set(new_data, label=f"Create {diff_name}")
             error_store.set("")
         except Exception as e:
             error_store.set(f"Error creating difference feature: {str(e)}")
@@ -334,14 +339,14 @@ def feature_engineering_server(input, output, session):
         
         try:
             # Create new data frame
-            new_data = data.copy()
+            new_data = data.copy(deep=False)
             
             # Create product feature
             product_name = f"{feature1}_times_{feature2}"
             new_data[product_name] = new_data[feature1] * new_data[feature2]
             
             # Update data
-            df_engineered.set(new_data)
+            df_engineered.set(new_data, label=f"Create {product_name}")
             error_store.set("")
         except Exception as e:
             error_store.set(f"Error creating product feature: {str(e)}")
@@ -366,7 +371,7 @@ def feature_engineering_server(input, output, session):
             new_data = data.drop(columns=[feature])
             
             # Update data
-            df_engineered.set(new_data)
+            df_engineered.set(new_data, label=f"Delete {feature}")
             error_store.set("")
         except Exception as e:
             error_store.set(f"Error deleting feature: {str(e)}")
@@ -389,7 +394,7 @@ def feature_engineering_server(input, output, session):
         
         try:
             # Create new data frame
-            new_data = data.copy()
+            new_data = data.copy(deep=False)
             
             # Apply selected transformation
             if method == "Standardization (StandardScaler)":
@@ -429,7 +434,7 @@ def feature_engineering_server(input, output, session):
                 new_data[f"{feature}_binary"] = (new_data[feature] > threshold).astype(int)
             
             # Update data
-            df_engineered.set(new_data)
+            df_engineered.set(new_data, label=f"{method} ({feature})")
             error_store.set("")
         except Exception as e:
             error_store.set(f"Error applying transformation: {str(e)}")
@@ -458,7 +463,7 @@ def feature_engineering_server(input, output, session):
         
         try:
             # Create new data frame
-            new_data = data.copy()
+            new_data = data.copy(deep=False)
             
             # Apply selected transformation
             if method == "Standardization (StandardScaler)":
@@ -474,7 +479,7 @@ def feature_engineering_server(input, output, session):
                 new_data[features] = scaler.fit_transform(new_data[features])
             
             # Update data
-            df_engineered.set(new_data)
+            df_engineered.set(new_data, label=f"{method} ({len(features)} features)")
             error_store.set("")
         except Exception as e:
             error_store.set(f"Error applying batch transformation: {str(e)}")
@@ -506,7 +511,7 @@ def feature_engineering_server(input, output, session):
         
         try:
             # Create new data frame
-            new_data = data.copy()
+            new_data = data.copy(deep=False)
             
             # Apply PCA
             pca = PCA(n_components=n_components)
@@ -524,7 +529,7 @@ def feature_engineering_server(input, output, session):
                     pca_df[col] = new_data[col].values
             
             # Update data
-            df_engineered.set(pca_df)
+            df_engineered.set(pca_df, label=f"PCA ({n_components} components)")
             
             # Display explained variance ratio
             explained_variance = pca.explained_variance_ratio_
@@ -542,11 +547,33 @@ def feature_engineering_server(input, output, session):
             # Only keep numeric columns for feature engineering
             numeric_data = cleaned_data.select_dtypes(include=['number'])
             if not numeric_data.empty:
-                df_engineered.set(numeric_data.copy())
+                df_engineered.set(numeric_data.copy(deep=False), label="Restore Original Data")
             else:
-                df_engineered.set(cleaned_data.copy())
+                df_engineered.set(cleaned_data.copy(deep=False), label="Restore Original Data")
             error_store.set("")
     
+    # Undo and redo feature engineering steps
+    @reactive.effect
+    @reactive.event(input.undo_engineering)
+    def undo_engineering():
+        label = df_engineered.undo()
+        error_store.set(f"Undone: {label}" if label else "Nothing to undo")
+
+    @reactive.effect
+    @reactive.event(input.redo_engineering)
+    def redo_engineering():
+        label = df_engineered.redo()
+        error_store.set(f"Redone: {label}" if label else "Nothing to redo")
+
+    @output
+    @render.text
+    def engineering_history():
+        undo, redo = df_engineered.history()
+        if not undo and not redo:
+            return ""
+        last = f", last: {undo[-1]}" if undo else ""
+        return f"{len(undo)} step(s) to undo, {len(redo)} to redo{last}"
+    
     # Use engineered features
     @reactive.effect
     @reactive.event(input.use_engineered)
@@ -566,10 +593,10 @@ def initialize_engineered_data():
         # Only keep numeric columns for feature engineering
         numeric_data = cleaned_data.select_dtypes(include=['number'])
         if not numeric_data.empty:
-            df_engineered.set(numeric_data.copy())
+            df_engineered.set(numeric_data.copy(deep=False))
         else:
             # If no numeric columns, use original data
-            df_engineered.set(cleaned_data.copy())
+            df_engineered.set(cleaned_data.copy(deep=False))
         print("Feature Engineering data initialized externally")
 
 # Export independent UI update function for external calling
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import tempfile
+import pandas as pd
+
+# Check if pyarrow library is installed for storing cached frames as Feather
+try:
+    import pyarrow as pa
+    import pyarrow.feather as pa_feather
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Location and size limit of the on-disk cache of parsed uploads
+CACHE_DIR = os.environ.get("INGEST_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ingest_cache"))
+CACHE_MAX_BYTES = int(os.environ.get("INGEST_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+# Bytes hashed per read when fingerprinting a file
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Cache hit and miss counters for this process
+cache_stats = {"hits": 0, "misses": 0}
+
+
+def file_digest(file_path, on_progress=None):
+    """Hash the contents of a file without loading it into memory.
+
+    on_progress is called with the fraction hashed after every block, and
+    may raise to stop hashing.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    total_bytes = max(os.path.getsize(file_path), 1)
+    hashed = 0
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+            hashed += len(block)
+            if on_progress is not None:
+                on_progress(min(hashed / total_bytes, 1.0))
+    return digest.hexdigest()
+
+
+def cache_key(file_path, options, on_progress=None):
+    """Key a parsed file by its content and the options it was parsed with"""
+    options_json = json.dumps(options, sort_keys=True, default=str)
+    return hashlib.blake2b(f"{file_digest(file_path, on_progress)}|{options_json}".encode(), digest_size=20).hexdigest()
+
+
+def write_frame(path_stem, df):
+    """Write a DataFrame as Feather, or as pickle when Feather cannot hold it; return the file path"""
+    if HAS_PYARROW and all(isinstance(col, str) for col in df.columns):
+        try:
+            table = pa.Table.from_pandas(df)
+            path = f"{path_stem}.feather"
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            pa_feather.write_feather(table, tmp_path)
+            os.replace(tmp_path, path)
+            return path
+        except (pa.ArrowException, ValueError, TypeError):
+            # Mixed-type object columns and similar cannot be stored in Arrow
+            pass
+
+    path = f"{path_stem}.pkl"
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    df.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_frame(path):
+    """Read a DataFrame written by write_frame"""
+    if path.endswith(".feather"):
+        return pa_feather.read_table(path, memory_map=True).to_pandas(split_blocks=True, self_destruct=True)
+    return pd.read_pickle(path)
+
+
+def _cached_path(key):
+    for ext in (".feather", ".pkl"):
+        path = os.path.join(CACHE_DIR, key + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_cached(key):
+    """Return the cached frame for a key, or None if it is not cached"""
+    path = _cached_path(key)
+    if path is not None:
+        try:
+            df = read_frame(path)
+            # Mark the entry as recently used for LRU eviction
+            os.utime(path)
+            cache_stats["hits"] += 1
+            return df
+        except Exception as e:
+            print(f"Ingest cache: dropping unreadable entry {path}: {str(e)}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    cache_stats["misses"] += 1
+    return None
+
+
+def store_cached(key, df):
+    """Add a parsed frame to the cache and evict least recently used entries over the size limit"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        write_frame(os.path.join(CACHE_DIR, key), df)
+        evict_cached()
+    except OSError as e:
+        # A full or read-only disk should never stop a file from loading
+        print(f"Ingest cache: could not store entry: {str(e)}")
+
+
+def evict_cached(max_bytes=None):
+    """Remove least recently used cache entries until the cache fits in max_bytes"""
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    with os.scandir(CACHE_DIR) as it:
+        for entry in it:
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total_bytes -= size
+        except OSError:
+            pass
+    return total_bytes
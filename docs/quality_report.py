@@ -0,0 +1,78 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from column_profile import column_profile
+
+# Columns profiled at the same time; numpy and pandas release the GIL for most of the work
+QUALITY_WORKERS = int(os.environ.get("QUALITY_REPORT_WORKERS", str(min(8, os.cpu_count() or 1))))
+# Number of whole-dataset reports kept in memory, across all sessions
+REPORT_CACHE_SIZE = 16
+
+# Thresholds above which a column is flagged
+HIGH_MISSING_RATE = 0.5
+HIGH_CARDINALITY = 100
+NUMERIC_LOOKING_SHARE = 0.8
+
+_reports = OrderedDict()
+_reports_lock = threading.Lock()
+
+
+def column_issues(profile):
+    """Cleaning problems found in a column profile, as short descriptions"""
+    issues = []
+    if profile["missing_rate"] > HIGH_MISSING_RATE:
+        issues.append("mostly missing")
+    elif profile["missing_rate"] > 0:
+        issues.append("missing values")
+    if profile["numeric"]:
+        if profile["iqr_outliers"] > 0:
+            issues.append("outliers")
+        if profile["std"] > 10 * profile["mean"]:
+            issues.append("wide range")
+    else:
+        if profile["nunique"] > HIGH_CARDINALITY:
+            issues.append("high cardinality")
+        if profile.get("numeric_share", 0) > NUMERIC_LOOKING_SHARE:
+            issues.append("looks numeric")
+    return issues
+
+
+def quality_report(keys, data):
+    """One row of quality measures per column of data, worst columns first.
+
+    keys holds each column's SessionValue.column_key(), so profiles are
+    shared with the single-column outputs and only changed columns are
+    profiled again. Columns are profiled in parallel.
+    """
+    report_key = tuple(keys)
+    with _reports_lock:
+        report = _reports.get(report_key)
+        if report is not None:
+            _reports.move_to_end(report_key)
+            return report
+
+    with ThreadPoolExecutor(max_workers=QUALITY_WORKERS) as executor:
+        profiles = list(executor.map(lambda key, col: column_profile(key, data[col]), keys, data.columns))
+
+    rows = []
+    for col, profile in zip(data.columns, profiles):
+        issues = column_issues(profile)
+        rows.append({
+            "Column": col,
+            "Type": profile["dtype"],
+            "Missing": profile["missing_rate"],
+            "Outliers (IQR)": profile["iqr_outliers"] / profile["rows"] if profile["numeric"] and profile["rows"] else None,
+            "Unique Values": profile["nunique"],
+            "Issues": ", ".join(issues),
+            "issue_count": len(issues),
+        })
+    report = pd.DataFrame(rows, columns=["Column", "Type", "Missing", "Outliers (IQR)", "Unique Values", "Issues", "issue_count"])
+    report = report.sort_values("issue_count", ascending=False, kind="stable").drop(columns="issue_count").reset_index(drop=True)
+
+    with _reports_lock:
+        _reports[report_key] = report
+        while len(_reports) > REPORT_CACHE_SIZE:
+            _reports.popitem(last=False)
+    return report
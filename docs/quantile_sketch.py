@@ -0,0 +1,193 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Rank error of the quantile sketches, as a fraction of the number of values
+SKETCH_ERROR = float(os.environ.get("QUANTILE_SKETCH_ERROR", "0.005"))
+# Columns with more values than this use a sketch instead of exact quantiles
+EXACT_QUANTILE_ROWS = 1_000_000
+# Values added to a sketch at a time, so converting a column never copies all of it
+SKETCH_CHUNK_ROWS = 1_000_000
+# Number of column sketches kept in memory, across all sessions
+SKETCH_CACHE_SIZE = 256
+# Scales the median absolute deviation to the standard deviation of normal data
+MAD_SCALE = 1.4826
+
+_sketches = OrderedDict()
+_sketches_lock = threading.Lock()
+
+
+class QuantileSketch:
+    """Mergeable KLL-style sketch of a stream of numbers for approximate quantiles.
+
+    Values are kept in levels of compactors; when a level is full, half of
+    its sorted values move up a level with twice the weight. Ranks are
+    within about error * n of the exact rank, using O(log(n) / error) memory.
+    Sketches built from parts of a column can be merged.
+    """
+
+    def __init__(self, error=SKETCH_ERROR, seed=0):
+        self.error = error
+        self.k = max(8, int(np.ceil(1.7 / error)))
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self.min = np.nan
+        self.max = np.nan
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        # Lower levels are smaller, so most memory goes to the heavier levels
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        """Add an array of values; missing values are ignored"""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.n += len(values)
+        self.min = np.fmin(self.min, values.min())
+        self.max = np.fmax(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Add everything another sketch has seen to this one"""
+        if other.n == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(items)
+            # An odd value out stays at this level; every other one of the rest moves up
+            leftover = len(items) % 2
+            offset = self._rng.integers(2)
+            self.levels[level] = items[len(items) - leftover:]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[offset:len(items) - leftover:2]])
+            # Capacities depend on the number of levels, so check again from the bottom
+            level = 0
+
+    def _weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(values), 2.0 ** level) for level, values in enumerate(self.levels)])
+        order = np.argsort(items)
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """Approximate quantiles for q in [0, 1] (a number or an array)"""
+        if self.n == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        items, cumulative = self._weighted_items()
+        positions = np.searchsorted(cumulative, np.asarray(q) * cumulative[-1], side="left")
+        result = items[np.clip(positions, 0, len(items) - 1)]
+        # The extremes are tracked exactly
+        result = np.where(np.asarray(q) <= 0, self.min, np.where(np.asarray(q) >= 1, self.max, result))
+        return result if np.ndim(q) else float(result)
+
+    def rank(self, x):
+        """Approximate number of values below x (a number or an array)"""
+        if self.n == 0:
+            return np.zeros(np.shape(x)) if np.ndim(x) else 0.0
+        items, cumulative = self._weighted_items()
+        positions = np.searchsorted(items, x, side="left")
+        below = np.where(positions > 0, cumulative[np.maximum(positions - 1, 0)], 0.0)
+        # Rescale from the sketch's weights to the number of values seen
+        below = below * self.n / cumulative[-1]
+        return below if np.ndim(x) else float(below)
+
+    def count_outside(self, lower, upper):
+        """Approximate number of values below lower or above upper"""
+        above = self.n - self.rank(np.nextafter(upper, np.inf))
+        return int(round(self.rank(lower) + above))
+
+    def deviation_quantile(self, center, q):
+        """Approximate quantile of the absolute deviations from center, e.g. the MAD for center=median, q=0.5"""
+        if self.n == 0:
+            return np.nan
+        items, cumulative = self._weighted_items()
+        weights = np.diff(cumulative, prepend=0.0)
+        deviations = np.abs(items - center)
+        order = np.argsort(deviations)
+        cumulative = np.cumsum(weights[order])
+        position = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        return float(deviations[order][min(position, len(deviations) - 1)])
+
+
+def numeric_values(series):
+    """Non-missing values of a numeric column as a float array"""
+    return series.dropna().to_numpy(dtype=float)
+
+
+def build_sketch(series, error=SKETCH_ERROR):
+    """Sketch a numeric column chunk by chunk"""
+    sketch = QuantileSketch(error)
+    for start in range(0, len(series), SKETCH_CHUNK_ROWS):
+        sketch.update(numeric_values(series.iloc[start:start + SKETCH_CHUNK_ROWS]))
+    return sketch
+
+
+def needs_sketch(series):
+    """Whether a column is numeric and large enough that exact quantiles are slow"""
+    return pd.api.types.is_numeric_dtype(series) and len(series) > EXACT_QUANTILE_ROWS
+
+
+def column_sketch(key, series):
+    """Sketch of a numeric column, built only once for each key (see SessionValue.column_key)"""
+    with _sketches_lock:
+        sketch = _sketches.get(key)
+        if sketch is not None:
+            _sketches.move_to_end(key)
+            return sketch
+
+    sketch = build_sketch(series)
+    with _sketches_lock:
+        _sketches[key] = sketch
+        while len(_sketches) > SKETCH_CACHE_SIZE:
+            _sketches.popitem(last=False)
+    return sketch
+
+
+def outlier_bounds(series, method, threshold, sketch=None):
+    """Lower and upper bounds outside which values count as outliers.
+
+    "IQR" uses the quartiles widened by threshold interquartile ranges and
+    "MAD" the median widened by threshold scaled median absolute deviations.
+    With a sketch the quantiles are approximate and need no pass over the data.
+    """
+    if sketch is None:
+        values = numeric_values(series)
+        if not len(values):
+            return np.nan, np.nan
+    if method == "IQR":
+        q1, q3 = sketch.quantile([0.25, 0.75]) if sketch is not None else np.quantile(values, [0.25, 0.75])
+        iqr = q3 - q1
+        return q1 - threshold * iqr, q3 + threshold * iqr
+    if method == "MAD":
+        if sketch is not None:
+            median = sketch.quantile(0.5)
+            mad = sketch.deviation_quantile(median, 0.5)
+        else:
+            median = np.median(values)
+            mad = np.median(np.abs(values - median))
+        return median - threshold * MAD_SCALE * mad, median + threshold * MAD_SCALE * mad
+    raise ValueError(f"Unknown outlier method: {method}")
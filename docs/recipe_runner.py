@@ -0,0 +1,110 @@
+"""Replay a cleaning recipe downloaded from the Data Cleaning tab on a large CSV file.
+
+Usage: python recipe_runner.py cleaning_recipe.json input.csv output.csv [--chunk-rows N] [--workers N]
+
+The file is read and written in chunks, so memory use depends on the chunk
+size rather than the file size. Steps that only look at their own rows run on
+several processes; Forward Fill and everything after it runs in order in this
+process so values carry over from one chunk to the next.
+"""
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from cleaning_steps import apply_step, recipe_steps, WHOLE_FILE_FILL_METHODS
+
+DEFAULT_CHUNK_ROWS = 200_000
+# Steps that expect text in the columns they were fitted on
+TEXT_ACTIONS = ["Standardize Text", "One-Hot Encoding", "Convert to Numeric"]
+
+
+def split_recipe(steps):
+    """Split the steps into those that can run on chunks independently and those that must run in order"""
+    for i, step in enumerate(steps):
+        method = step["params"].get("method") if step["action"] == "Fill Missing Values" else None
+        if method in WHOLE_FILE_FILL_METHODS:
+            raise ValueError(f"{method} needs later rows and cannot be replayed chunk by chunk")
+        if method == "Forward Fill":
+            return steps[:i], steps[i:]
+    return steps, []
+
+
+def text_columns(steps):
+    """Columns first used by a text step, to be read as text in every chunk.
+
+    pd.read_csv infers the types of each chunk separately, so a text column
+    that is all missing or all digits in one chunk would otherwise be read
+    as numbers there.
+    """
+    first_actions = {}
+    for step in steps:
+        for col in step["columns"]:
+            first_actions.setdefault(col, step["action"])
+    return [col for col, action in first_actions.items() if action in TEXT_ACTIONS]
+
+
+def apply_steps(chunk, steps, carry=None):
+    for step in steps:
+        chunk = apply_step(chunk, step, carry)
+    return chunk
+
+
+def run_recipe(steps, input_path, output_path, chunk_rows=DEFAULT_CHUNK_ROWS, workers=None):
+    """Apply the steps to input_path chunk by chunk and write the result to output_path; return the rows written"""
+    parallel_steps, ordered_steps = split_recipe(steps)
+    workers = workers or os.cpu_count() or 1
+    # Last valid values for Forward Fill, carried from one chunk to the next
+    carry = {}
+    rows_written = None
+
+    def write(chunk):
+        nonlocal rows_written
+        chunk = apply_steps(chunk, ordered_steps, carry)
+        # The first chunk creates the file and writes the header, even if all its rows were removed
+        first = rows_written is None
+        chunk.to_csv(output_path, mode="w" if first else "a", header=first, index=False)
+        rows_written = (rows_written or 0) + len(chunk)
+
+    # Columns missing from the file (e.g. created by an earlier step) are ignored by dtype
+    chunks = pd.read_csv(input_path, chunksize=chunk_rows, dtype={col: str for col in text_columns(steps)})
+    if workers == 1:
+        for chunk in chunks:
+            write(apply_steps(chunk, parallel_steps))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Only a few chunks are in flight at once to keep memory bounded; results are written in order
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(apply_steps, chunk, parallel_steps))
+                if len(pending) >= workers * 2:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+    return rows_written or 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a cleaning recipe on a large CSV file")
+    parser.add_argument("recipe", help="Recipe JSON file downloaded from the Data Cleaning tab")
+    parser.add_argument("input", help="CSV file to clean (may be compressed, e.g. .csv.gz)")
+    parser.add_argument("output", help="Where to write the cleaned CSV file")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows read per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    with open(args.recipe) as f:
+        steps = recipe_steps(json.load(f))
+    try:
+        run_recipe(steps, args.input, args.output, args.chunk_rows, args.workers)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Applied {len(steps)} cleaning steps to {args.input}, written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
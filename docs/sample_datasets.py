@@ -0,0 +1,147 @@
+import threading
+import numpy as np
+import pandas as pd
+
+# Upper limits for the synthetic dataset generator
+SYNTHETIC_MAX_ROWS = 50_000_000
+SYNTHETIC_MAX_COLS = 500
+
+# Column kinds cycled through by the synthetic dataset generator
+SYNTHETIC_COLUMN_KINDS = ["float", "int", "category", "skewed", "bool", "datetime"]
+SYNTHETIC_CATEGORIES = ["north", "south", "east", "west", "central"]
+
+# Built datasets shared by all sessions; only the latest synthetic dataset is kept
+_dataset_cache = {}
+_synthetic_cache = {}
+_cache_lock = threading.Lock()
+
+
+def build_iris_dataset():
+    from sklearn.datasets import load_iris
+    data = load_iris()
+    df = pd.DataFrame(data.data, columns=data.feature_names)
+    df['target'] = data.target
+    return df
+
+
+def build_boston_dataset():
+    # Since the Boston housing dataset in sklearn has been deprecated, we manually create a simplified version
+    rng = np.random.RandomState(42)
+    n_samples = 100
+    return pd.DataFrame({
+        'CRIM': rng.exponential(0.5, n_samples),
+        'ZN': rng.choice([0, 20, 40, 60, 80, 100], n_samples),
+        'INDUS': rng.uniform(0, 20, n_samples),
+        'CHAS': rng.choice([0, 1], n_samples),
+        'NOX': rng.uniform(0.4, 0.8, n_samples),
+        'RM': rng.normal(6, 1, n_samples),
+        'AGE': rng.uniform(20, 90, n_samples),
+        'DIS': rng.exponential(3, n_samples),
+        'RAD': rng.choice([1, 2, 3, 4, 5, 6, 7, 8, 24], n_samples),
+        'TAX': rng.uniform(200, 700, n_samples),
+        'PTRATIO': rng.uniform(12, 22, n_samples),
+        'B': rng.uniform(0, 400, n_samples),
+        'LSTAT': rng.exponential(7, n_samples),
+        'MEDV': rng.normal(22, 9, n_samples)
+    })
+
+
+def build_wine_dataset():
+    from sklearn.datasets import load_wine
+    data = load_wine()
+    df = pd.DataFrame(data.data, columns=data.feature_names)
+    df['target'] = data.target
+    return df
+
+
+# Fixed sample datasets by name
+SAMPLE_DATASETS = {
+    "iris": build_iris_dataset,
+    "boston": build_boston_dataset,
+    "wine": build_wine_dataset,
+}
+
+
+def make_synthetic_column(rng, kind, n_rows, missing_rate):
+    """Generate one column of the given kind, with roughly missing_rate of its values missing"""
+    missing = rng.random(n_rows) < missing_rate if missing_rate > 0 else None
+
+    if kind == "float":
+        values = rng.normal(50, 15, n_rows)
+    elif kind == "skewed":
+        values = rng.exponential(3, n_rows)
+    elif kind == "int":
+        values = rng.integers(0, 1000, n_rows)
+        if missing is not None:
+            return pd.arrays.IntegerArray(values, missing)
+        return values
+    elif kind == "category":
+        codes = rng.integers(0, len(SYNTHETIC_CATEGORIES), n_rows).astype(np.int8)
+        if missing is not None:
+            codes[missing] = -1
+        return pd.Categorical.from_codes(codes, categories=SYNTHETIC_CATEGORIES)
+    elif kind == "bool":
+        values = rng.random(n_rows) < 0.5
+        if missing is not None:
+            return pd.arrays.BooleanArray(values, missing)
+        return values
+    elif kind == "datetime":
+        seconds = rng.integers(0, 5 * 365 * 24 * 3600, n_rows)
+        values = np.datetime64("2020-01-01", "s") + seconds.astype("timedelta64[s]")
+        if missing is not None:
+            values[missing] = np.datetime64("NaT")
+        return values
+    else:
+        raise ValueError(f"Unknown synthetic column kind: {kind}")
+
+    if missing is not None:
+        values[missing] = np.nan
+    return values
+
+
+def make_synthetic_dataset(n_rows=1_000_000, n_cols=20, missing_rate=0.05, seed=42, on_progress=None):
+    """Generate a Boston-style dataset of any size with mixed column types and missing values.
+
+    The same arguments always produce the same data.
+    """
+    if not 1 <= n_rows <= SYNTHETIC_MAX_ROWS:
+        raise ValueError(f"Number of rows must be between 1 and {SYNTHETIC_MAX_ROWS:,}")
+    if not 1 <= n_cols <= SYNTHETIC_MAX_COLS:
+        raise ValueError(f"Number of columns must be between 1 and {SYNTHETIC_MAX_COLS}")
+    if not 0 <= missing_rate < 1:
+        raise ValueError("Missing rate must be between 0 and 1")
+
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for i in range(n_cols):
+        kind = SYNTHETIC_COLUMN_KINDS[i % len(SYNTHETIC_COLUMN_KINDS)]
+        columns[f"{kind}_{i}"] = make_synthetic_column(rng, kind, n_rows, missing_rate)
+        if on_progress is not None:
+            on_progress((i + 1) / n_cols)
+    return pd.DataFrame(columns, copy=False)
+
+
+def get_sample_dataset(name, params=None, on_progress=None):
+    """Return a sample dataset, building it only the first time it is requested in this process.
+
+    The frame is shared between sessions, so callers get a shallow copy and
+    must not modify its values in place.
+    """
+    if name == "synthetic":
+        key = tuple(sorted((params or {}).items()))
+        with _cache_lock:
+            df = _synthetic_cache.get(key)
+        if df is None:
+            df = make_synthetic_dataset(**(params or {}), on_progress=on_progress)
+            with _cache_lock:
+                # Synthetic datasets can be very large, so only the latest one is kept
+                _synthetic_cache.clear()
+                _synthetic_cache[key] = df
+    else:
+        with _cache_lock:
+            df = _dataset_cache.get(name)
+        if df is None:
+            df = SAMPLE_DATASETS[name]()
+            with _cache_lock:
+                df = _dataset_cache.setdefault(name, df)
+    return df.copy(deep=False)
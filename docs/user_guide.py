@@ -9,7 +9,7 @@ user_guide_layout = ui.card(
             
             ui.h3("Key Features"),
             ui.tags.ul(
-                ui.tags.li(ui.tags.b("Data Upload:"), " Support for CSV, Excel, JSON, and RDS files"),
+                ui.tags.li(ui.tags.b("Data Upload:"), " Support for CSV, Excel, JSON, RDS, Parquet, Feather and Arrow files"),
                 ui.tags.li(ui.tags.b("Data Cleaning:"), " Remove duplicates, handle missing values, outliers, normalize/standardize, encode categorical variables, and convert numeric-like columns"),
                 ui.tags.li(ui.tags.b("Feature Engineering:"), " Apply mathematical transformations, create custom columns, and rename columns"),
                 ui.tags.li(ui.tags.b("Exploratory Data Analysis:"), " Generate interactive histograms, boxplots, bar charts, scatter plots, and correlation heatmaps"),
@@ -34,9 +34,12 @@ user_guide_layout = ui.card(
             ui.h4("1. Data Upload"),
             ui.p("This section allows you to upload your data files or use sample datasets."),
             ui.tags.ul(
-                ui.tags.li(ui.tags.b("Upload Files:"), " Click 'Browse Files' to select a file from your computer. Supported formats include CSV, Excel, JSON, and RDS."),
+                ui.tags.li(ui.tags.b("Upload Files:"), " Click 'Browse Files' to select a file from your computer. Supported formats include CSV, Excel, JSON, NDJSON (JSON Lines), RDS, Parquet, Feather and Arrow. Files compressed with gzip (.gz), bzip2 (.bz2), xz (.xz), Zstandard (.zst) or zip (.zip) are decompressed while they load, e.g. data.csv.gz. For Parquet, Feather and Arrow files you can pick the columns to load; for Excel files you can pick one or more sheets and stack sheets that share the same columns."),
                 ui.tags.li(ui.tags.b("Process Data:"), " After selecting a file, click 'Process Data' to load it into the application."),
+                ui.tags.li(ui.tags.b("Cancel Loading:"), " Files and sample datasets load in the background with a progress bar. Click 'Cancel Loading' to stop a load that is taking too long."),
+                ui.tags.li(ui.tags.b("Compact Data Types:"), " Tick 'Compact data types' before loading to store numbers in the smallest safe type and repeated text as categories. The Data Types table then shows memory use before and after."),
                 ui.tags.li(ui.tags.b("Sample Datasets:"), " If you don't have your own data, you can use one of the provided sample datasets (Iris, Boston Housing, or Wine)."),
+                ui.tags.li(ui.tags.b("Synthetic Dataset:"), " Choose a number of rows, columns and a missing rate, then click 'Synthetic Dataset' to generate reproducible data with numeric, integer, categorical, boolean and date columns. Useful for trying the app on large data."),
                 ui.tags.li(ui.tags.b("Data Preview:"), " Once loaded, you can preview your data, view summary statistics, and check data types.")
             ),
             
@@ -47,17 +50,21 @@ user_guide_layout = ui.card(
                 ui.tags.li(ui.tags.b("Select Column:"), " Choose a column from your dataset to clean."),
                 ui.tags.li(ui.tags.b("Cleaning Operations:"), " Select from various cleaning operations:"),
                 ui.tags.ul(
-                    ui.tags.li(ui.tags.i("Fill Missing Values:"), " Fill missing values using mean, median, mode, fixed value, forward fill, or backward fill."),
+                    ui.tags.li(ui.tags.i("Fill Missing Values:"), " Fill missing values using mean, median, mode, fixed value, forward fill, or backward fill. Group Mean, Group Median and Group Mode fill each gap with the statistic of its group in the 'Group By' column, and Time Interpolation fills numeric gaps linearly along the 'Order By' time column."),
                     ui.tags.li(ui.tags.i("Remove Missing Values:"), " Remove rows with missing values in the selected column."),
-                    ui.tags.li(ui.tags.i("Remove Outliers:"), " Remove outliers based on standard deviation threshold."),
+                    ui.tags.li(ui.tags.i("Remove Outliers:"), " Remove values more than a threshold number of standard deviations from the mean, interquartile ranges outside the quartiles (IQR), or scaled median absolute deviations from the median (MAD). MAD is least affected by the outliers themselves. On very large columns the quartiles and median are estimated from a quantile sketch."),
                     ui.tags.li(ui.tags.i("Convert to Numeric:"), " Convert text columns to numeric type."),
                     ui.tags.li(ui.tags.i("Standardize Text:"), " Standardize text by converting to lowercase and trimming whitespace."),
-                    ui.tags.li(ui.tags.i("One-Hot Encoding:"), " Convert categorical variables into binary columns.")
+                    ui.tags.li(ui.tags.i("One-Hot Encoding:"), " Convert categorical variables into binary columns. Only the most frequent categories (50 by default) get their own column; the rest are counted in an 'other' column. Tick 'Sparse indicators' for columns with many categories. The expected size is shown before applying, and encodings that would use too much memory are refused.")
                 ),
+                ui.tags.li(ui.tags.b("Batch Columns:"), " Optionally pick several columns under 'Batch Columns' to apply the operation to all of them at once. Columns the operation does not apply to (e.g. text columns for a mean fill) are skipped and listed."),
                 ui.tags.li(ui.tags.b("Apply Cleaning:"), " Click 'Apply Cleaning' to execute the selected operation."),
                 ui.tags.li(ui.tags.b("Reset Data:"), " Click 'Reset Data' to revert to the original data."),
+                ui.tags.li(ui.tags.b("Undo / Redo:"), " Click 'Undo' to step back through your recent cleaning operations (including a reset) and 'Redo' to apply them again. Loading new data starts a new history."),
+                ui.tags.li(ui.tags.b("Download Recipe:"), " Click 'Download Recipe' to save the cleaning operations applied so far as a JSON file. Run it on new files with recipe_runner.py to repeat the same cleaning without the app."),
                 ui.tags.li(ui.tags.b("Column Information:"), " View distribution and statistics for the selected column."),
-                ui.tags.li(ui.tags.b("Cleaning Suggestions:"), " The application provides suggestions for cleaning based on the column's characteristics.")
+                ui.tags.li(ui.tags.b("Cleaning Suggestions:"), " The application provides suggestions for cleaning based on the column's characteristics."),
+                ui.tags.li(ui.tags.b("Data Quality Report:"), " Lists every column with its missing rate, share of outliers, number of unique values and any problems found (missing values, outliers, wide range, high cardinality, numbers stored as text), worst columns first. It is updated in the background after each change.")
             ),
             
             # Exploratory Analysis Section
@@ -102,6 +109,7 @@ user_guide_layout = ui.card(
                     ui.tags.li("Choose from various transformations (log, square root, standardization, normalization, etc.)."),
                     ui.tags.li("Click 'Apply Transformation' to transform the feature.")
                 ),
+                ui.tags.li(ui.tags.b("Undo / Redo:"), " Step back through feature creation, deletion and transformations, or apply them again. Changing the cleaned data starts a new history."),
                 ui.tags.li(ui.tags.b("Feature Selection:"), " Select important features for your analysis:"),
                 ui.tags.ul(
                     ui.tags.li("Choose a target variable."),
@@ -145,7 +153,7 @@ user_guide_layout = ui.card(
             
             ui.h3("Troubleshooting"),
             ui.tags.ul(
-                ui.tags.li(ui.tags.b("File Upload Issues:"), " Ensure your file is in a supported format (CSV, Excel, JSON, RDS) and is not corrupted."),
+                ui.tags.li(ui.tags.b("File Upload Issues:"), " Ensure your file is in a supported format (CSV, Excel, JSON, RDS, Parquet, Feather, Arrow) and is not corrupted."),
                 ui.tags.li(ui.tags.b("Data Processing Errors:"), " Check error messages for specific issues with your data."),
                 ui.tags.li(ui.tags.b("Visualization Problems:"), " Some visualizations may not work well with certain data types or large datasets."),
                 ui.tags.li(ui.tags.b("Feature Engineering Errors:"), " Ensure your Python expressions are valid and reference existing column names."),
@@ -0,0 +1,11 @@
+import pandas as pd
+from column_profile import compute_profile
+
+
+def test_profile_ignores_unused_categories():
+    series = pd.Series(["a", "b", "c", "a"], dtype="category")
+
+    profile = compute_profile(series[series == "a"])
+
+    assert profile["nunique"] == 1
+    assert profile["top_values"] == [("a", 2)]
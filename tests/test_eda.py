@@ -0,0 +1,26 @@
+import pandas as pd
+from shiny import reactive
+from column_profile import compute_profile
+from data_store import SessionValue
+from eda import requested_columns
+
+
+def test_filter_column_equal_to_analysed_column():
+    store = SessionValue(None, "test_eda")
+    with reactive.isolate():
+        store.set(pd.DataFrame({"a": [1.0, 2.0, 3.0], "b": ["x", "y", "x"]}))
+        # The default selection filters and analyses the same column
+        data = store.get_columns(requested_columns(["a", None, "a"]))
+
+    assert list(data.columns) == ["a"]
+    assert isinstance(data["a"], pd.Series)
+    assert compute_profile(data["a"])["count"] == 3
+
+
+def test_get_columns_ignores_repeated_names():
+    store = SessionValue(None, "test_eda_repeats")
+    with reactive.isolate():
+        store.set(pd.DataFrame({"a": [1, 2], "b": [3, 4]}))
+        data = store.get_columns(["a", "b", "a"])
+
+    assert list(data.columns) == ["a", "b"]
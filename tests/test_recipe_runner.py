@@ -0,0 +1,33 @@
+import json
+import numpy as np
+import pandas as pd
+from cleaning_steps import clean_columns, recipe_document
+from recipe_runner import main
+
+
+def test_chunked_replay_with_types_changing_between_chunks(tmp_path):
+    # In chunks of 3 rows, "name" is all missing in the second chunk and all
+    # digits in the third, and "x" has a stray string in the second chunk
+    data = pd.DataFrame({
+        "name": [" Ann", "BOB ", "Cy", None, None, None, "1", "2", "3"],
+        "x": ["1.0", "2.0", "3.0", "4.0", "oops", "6.0", "7.0", "8.0", "100.0"],
+    })
+    input_path = tmp_path / "input.csv"
+    data.to_csv(input_path, index=False)
+
+    # Fit the steps the way the app would, where "x" is numeric and the stray string is missing
+    loaded = data.assign(x=pd.to_numeric(data["x"], errors="coerce"))
+    steps = []
+    for columns, action in [(["name"], "Standardize Text"), (["x"], "Remove Outliers")]:
+        loaded, _, step = clean_columns(loaded, columns, action, {"outlier_method": "IQR", "outlier_threshold": 1.5})
+        steps.append(step)
+    recipe_path = tmp_path / "recipe.json"
+    recipe_path.write_text(json.dumps(recipe_document(steps), default=str))
+
+    output_path = tmp_path / "output.csv"
+    assert main([str(recipe_path), str(input_path), str(output_path), "--chunk-rows", "3", "--workers", "1"]) == 0
+
+    replayed = pd.read_csv(output_path, dtype={"name": str})
+    expected = loaded.reset_index(drop=True)
+    assert replayed["name"].tolist() == expected["name"].tolist()
+    np.testing.assert_allclose(replayed["x"], expected["x"])